@@ -1,28 +1,18 @@
-import sqlite3
-import functools
-from datetime import datetime  #  for timestamp logging
+import logging
 
-# ✅ Decorator to log SQL queries with a timestamp
-def log_queries(func):
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        query = kwargs.get('query') or (args[0] if args else None)
-        if query:
-            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            print(f"[{now}] Executing SQL Query: {query}")
-        return func(*args, **kwargs)
-    return wrapper
+# ✅ Structured query logging and pooled connections from the shared library
+from db_decorators import with_db_connection, log_queries, query_log
 
 @log_queries
-def fetch_all_users(query):
-    conn = sqlite3.connect('users.db')
+@with_db_connection
+def fetch_all_users(conn, query):
     cursor = conn.cursor()
     cursor.execute(query)
-    results = cursor.fetchall()
-    conn.close()
-    return results
+    return cursor.fetchall()
 
 # ✅ Fetch users while logging the query
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
     users = fetch_all_users(query="SELECT * FROM users")
     print(users)
+    print(query_log.summary())
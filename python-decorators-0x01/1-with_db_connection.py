@@ -1,17 +1,5 @@
-import sqlite3
-import functools
-
-# ✅ Decorator to handle DB connection automatically
-def with_db_connection(func):
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        conn = sqlite3.connect('users.db')
-        try:
-            result = func(conn, *args, **kwargs)
-            return result
-        finally:
-            conn.close()
-    return wrapper
+# ✅ Pooled connection handler from the shared decorator library
+from db_decorators import with_db_connection
 
 @with_db_connection
 def get_user_by_id(conn, user_id):
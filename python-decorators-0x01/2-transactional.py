@@ -1,31 +1,5 @@
-import sqlite3
-import functools
-
-# ✅ Reuse connection handler from Task 1
-def with_db_connection(func):
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        conn = sqlite3.connect('users.db')
-        try:
-            return func(conn, *args, **kwargs)
-        finally:
-            conn.close()
-    return wrapper
-
-# ✅ New decorator for transaction management
-def transactional(func):
-    @functools.wraps(func)
-    def wrapper(conn, *args, **kwargs):
-        try:
-            result = func(conn, *args, **kwargs)
-            conn.commit()
-            print("[TRANSACTION] Committed successfully.")
-            return result
-        except Exception as e:
-            conn.rollback()
-            print(f"[TRANSACTION] Rolled back due to error: {e}")
-            raise
-    return wrapper
+# ✅ Connection and transaction decorators from the shared library
+from db_decorators import with_db_connection, transactional
 
 @with_db_connection
 @transactional
@@ -1,37 +1,5 @@
-import time
-import sqlite3
-import functools
-
-# ✅ Reuse connection handler
-def with_db_connection(func):
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        conn = sqlite3.connect('users.db')
-        try:
-            return func(conn, *args, **kwargs)
-        finally:
-            conn.close()
-    return wrapper
-
-# ✅ Retry decorator
-def retry_on_failure(retries=3, delay=2):
-    def decorator(func):
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            attempt = 0
-            while attempt < retries:
-                try:
-                    return func(*args, **kwargs)
-                except Exception as e:
-                    attempt += 1
-                    print(f"[RETRY] Attempt {attempt} failed due to: {e}")
-                    if attempt < retries:
-                        time.sleep(delay)
-                    else:
-                        print("[RETRY] All retry attempts failed.")
-                        raise
-        return wrapper
-    return decorator
+# ✅ Connection and retry decorators from the shared library
+from db_decorators import with_db_connection, retry_on_failure
 
 @with_db_connection
 @retry_on_failure(retries=3, delay=1)
@@ -1,33 +1,5 @@
-import time
-import sqlite3
-import functools
-
-query_cache = {}
-
-# ✅ Connection manager from Task 1
-def with_db_connection(func):
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        conn = sqlite3.connect('users.db')
-        try:
-            return func(conn, *args, **kwargs)
-        finally:
-            conn.close()
-    return wrapper
-
-# ✅ Cache decorator
-def cache_query(func):
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        query = kwargs.get('query') or (args[1] if len(args) > 1 else None)
-        if query in query_cache:
-            print("[CACHE] Returning cached result.")
-            return query_cache[query]
-        print("[CACHE] Executing and caching result.")
-        result = func(*args, **kwargs)
-        query_cache[query] = result
-        return result
-    return wrapper
+# ✅ Connection and cache decorators from the shared library
+from db_decorators import with_db_connection, cache_query, query_cache
 
 @with_db_connection
 @cache_query
@@ -40,3 +12,4 @@ def fetch_users_with_cache(conn, query):
 if __name__ == "__main__":
     users = fetch_users_with_cache(query="SELECT * FROM users")
     users_again = fetch_users_with_cache(query="SELECT * FROM users")
+    print(f"[CACHE] {query_cache.metrics}")
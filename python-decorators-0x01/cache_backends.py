@@ -0,0 +1,475 @@
+import hashlib
+import marshal
+import mmap
+import os
+import sqlite3
+import stat
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Bumped whenever the serialized form changes; older entries read as misses
+FORMAT_VERSION = 1
+
+
+def digest(key):
+    """Returns a 16-byte digest of a cache key that is stable across processes"""
+    return hashlib.blake2b(repr(key).encode('utf-8'), digest_size=16).digest()
+
+
+def dumps(value):
+    """Serializes result rows (lists/tuples of str, int, float, bytes, None) compactly
+
+    Raises ValueError for values marshal can't store.
+    """
+    return bytes((FORMAT_VERSION,)) + marshal.dumps(value)
+
+
+def loads(data):
+    if not data or data[0] != FORMAT_VERSION:
+        raise ValueError("Unknown cache entry format")
+    return marshal.loads(data[1:])
+
+
+class MemoryBackend:
+    """In-process LRU of at most max_size entries, kept as Python objects"""
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._by_table = {}
+        self._generation = 0
+        self._invalidated_at = {}
+        self._lock = threading.Lock()
+        self.metrics = {'evictions': 0, 'invalidations': 0}
+
+    def _remove(self, key):
+        _, _, tables, _ = self._entries.pop(key)
+        for table in tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
+
+    def generation(self):
+        with self._lock:
+            return self._generation
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[1], entry[3]
+
+    def set(self, key, value, tables, expires_at, stale_until, generation=None):
+        with self._lock:
+            if generation is not None and any(
+                    self._invalidated_at.get(table, -1) > generation for table in tables):
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, stale_until, tables, value)
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.metrics['evictions'] += 1
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def invalidate(self, tables):
+        with self._lock:
+            self._generation += 1
+            for table in tables:
+                self._invalidated_at[table] = self._generation
+                for key in list(self._by_table.get(table, ())):
+                    self._remove(key)
+                    self.metrics['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _default_shm_path():
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    # Per user, so another user can't hand this one a file it controls
+    return os.path.join(directory, f'db_decorators_query_cache.{os.getuid()}')
+
+
+class SharedMemoryBackend:
+    """Fixed-size hash table in a memory-mapped file, shared by every process on the host
+
+    A key hashes to one of `slots` slots of slot_size bytes and a new entry
+    overwrites whatever its slot held, so results bigger than a slot (or
+    reading more than MAX_TABLES tables) are not cached. Writing a table
+    bumps one of 256 generation counters in the file header; an entry keeps
+    the counters of the tables it read and counts as gone once any of them
+    moves, so invalidation never scans the table. Lookups share a POSIX
+    file lock and writes take it exclusively, so processes read in
+    parallel; threads of one process still take turns. The first process
+    to open the file sets its size; others use the layout they find. A
+    file owned by another user, or one that isn't a cache file, is
+    refused rather than reused or overwritten.
+    """
+
+    MAGIC = b'QCACHE01'
+    HEADER = struct.Struct('<8sII')
+    COUNTERS = 256
+    MAX_TABLES = 8
+    # digest, expires_at, stale_until, value length, table count, counter indexes, generations
+    SLOT = struct.Struct(f'<16sddIB{MAX_TABLES}H{MAX_TABLES}Q')
+    EMPTY = bytes(16)
+
+    def __init__(self, path=None, slots=4096, slot_size=4096):
+        if fcntl is None:
+            raise ImportError("SharedMemoryBackend needs fcntl (POSIX only)")
+        self.path = path or _default_shm_path()
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+        try:
+            slots, slot_size = self._open_file(slots, slot_size)
+        except BaseException:
+            os.close(self._fd)
+            raise
+        self._lock = threading.Lock()
+        self.metrics = {'evictions': 0, 'invalidations': 0, 'too_large': 0}
+        os.register_at_fork(after_in_child=self._reset_lock)
+        self.slots = slots
+        self.slot_size = slot_size
+        self._counters_at = self.HEADER.size
+        self._slots_at = self._counters_at + self.COUNTERS * 8
+        self._map = mmap.mmap(self._fd, self._file_size(slots, slot_size))
+
+    def _open_file(self, slots, slot_size):
+        info = os.fstat(self._fd)
+        if info.st_uid != os.getuid() or not stat.S_ISREG(info.st_mode):
+            raise PermissionError(f"{self.path} is not a regular file owned by this user")
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            header = os.pread(self._fd, self.HEADER.size, 0)
+            if not header:
+                # Only an empty file is laid out here; others may have mapped the rest
+                os.ftruncate(self._fd, self._file_size(slots, slot_size))
+                os.pwrite(self._fd, self.HEADER.pack(self.MAGIC, slots, slot_size), 0)
+                return slots, slot_size
+            if len(header) < self.HEADER.size or header[:8] != self.MAGIC:
+                raise ValueError(f"{self.path} is not a query cache file")
+            _, slots, slot_size = self.HEADER.unpack(header)
+            if os.fstat(self._fd).st_size < self._file_size(slots, slot_size):
+                raise ValueError(f"{self.path} is shorter than its header says")
+            return slots, slot_size
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    def _file_size(self, slots, slot_size):
+        return self.HEADER.size + self.COUNTERS * 8 + slots * slot_size
+
+    def _reset_lock(self):
+        self._lock = threading.Lock()
+
+    def _locked(self, shared=False):
+        return _FileLock(self, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+
+    def _counter(self, index):
+        return struct.unpack_from('<Q', self._map, self._counters_at + index * 8)[0]
+
+    @staticmethod
+    def _counter_index(table):
+        return zlib.crc32(table.encode('utf-8')) % SharedMemoryBackend.COUNTERS
+
+    def _slot_offset(self, key_digest):
+        return self._slots_at + int.from_bytes(key_digest[:8], 'little') % self.slots * self.slot_size
+
+    def _is_current(self, fields):
+        count = fields[4]
+        indexes = fields[5:5 + count]
+        generations = fields[5 + self.MAX_TABLES:5 + self.MAX_TABLES + count]
+        return all(self._counter(index) == generation
+                   for index, generation in zip(indexes, generations))
+
+    def generation(self):
+        """Returns a snapshot of every table counter"""
+        with self._locked(shared=True):
+            return bytes(self._map[self._counters_at:self._slots_at])
+
+    def get(self, key):
+        key_digest = digest(key)
+        offset = self._slot_offset(key_digest)
+        with self._locked(shared=True):
+            fields = self.SLOT.unpack_from(self._map, offset)
+            if fields[0] != key_digest:
+                return None
+            if not self._is_current(fields):
+                # Left in place under the shared lock; the next set() overwrites it
+                self.metrics['invalidations'] += 1
+                return None
+            start = offset + self.SLOT.size
+            data = self._map[start:start + fields[3]]
+        try:
+            return fields[1], fields[2], loads(data)
+        except (ValueError, EOFError, TypeError):
+            self.delete(key)
+            return None
+
+    def set(self, key, value, tables, expires_at, stale_until, generation=None):
+        try:
+            data = dumps(value)
+        except ValueError:
+            return
+        if len(data) > self.slot_size - self.SLOT.size or len(tables) > self.MAX_TABLES:
+            self.metrics['too_large'] += 1
+            return
+        indexes = [self._counter_index(table) for table in tables]
+        padding = [0] * (self.MAX_TABLES - len(indexes))
+        key_digest = digest(key)
+        offset = self._slot_offset(key_digest)
+        with self._locked():
+            if generation is None:
+                generations = [self._counter(index) for index in indexes]
+            else:
+                # Counters from before the query ran, so a write that raced
+                # with it leaves the entry already invalid
+                generations = [struct.unpack_from('<Q', generation, index * 8)[0]
+                               for index in indexes]
+            previous = self._map[offset:offset + 16]
+            if previous != self.EMPTY and previous != key_digest:
+                self.metrics['evictions'] += 1
+            self.SLOT.pack_into(self._map, offset, key_digest, expires_at, stale_until,
+                                len(data), len(indexes), *(indexes + padding),
+                                *(generations + padding))
+            start = offset + self.SLOT.size
+            self._map[start:start + len(data)] = data
+
+    def delete(self, key):
+        key_digest = digest(key)
+        offset = self._slot_offset(key_digest)
+        with self._locked():
+            if self._map[offset:offset + 16] == key_digest:
+                self._map[offset:offset + 16] = self.EMPTY
+
+    def invalidate(self, tables):
+        with self._locked():
+            for index in {self._counter_index(table) for table in tables}:
+                position = self._counters_at + index * 8
+                struct.pack_into('<Q', self._map, position, self._counter(index) + 1)
+
+    def clear(self):
+        with self._locked():
+            for slot in range(self.slots):
+                offset = self._slots_at + slot * self.slot_size
+                self._map[offset:offset + 16] = self.EMPTY
+
+    def __len__(self):
+        with self._locked(shared=True):
+            return sum(
+                self._map[offset:offset + 16] != self.EMPTY
+                for offset in range(self._slots_at, len(self._map), self.slot_size))
+
+
+class _FileLock:
+    """Holds a backend's thread lock and then a shared or exclusive lock on its file
+
+    POSIX locks belong to the process, so the thread lock keeps a thread's
+    exclusive lock from being converted or released by another thread's.
+    """
+
+    __slots__ = ('backend', 'operation')
+
+    def __init__(self, backend, operation):
+        self.backend = backend
+        self.operation = operation
+
+    def __enter__(self):
+        self.backend._lock.acquire()
+        fcntl.lockf(self.backend._fd, self.operation)
+
+    def __exit__(self, *exc):
+        fcntl.lockf(self.backend._fd, fcntl.LOCK_UN)
+        self.backend._lock.release()
+
+
+class SQLiteBackend:
+    """Cache stored in a SQLite file, shared by local processes and kept across restarts
+
+    Once it holds more than max_size entries, expired entries are dropped
+    first and then those closest to expiring. Lookups run as plain reads,
+    which WAL mode lets proceed alongside a writer; only writes take the
+    write lock.
+    """
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS entries (
+            key BLOB PRIMARY KEY,
+            expires_at REAL NOT NULL,
+            stale_until REAL NOT NULL,
+            value BLOB NOT NULL
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_entries_stale_until ON entries (stale_until)",
+        """
+        CREATE TABLE IF NOT EXISTS entry_tables (
+            table_name TEXT NOT NULL,
+            key BLOB NOT NULL REFERENCES entries (key) ON DELETE CASCADE,
+            PRIMARY KEY (table_name, key)
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_entry_tables_key ON entry_tables (key)",
+        """
+        CREATE TABLE IF NOT EXISTS generations (
+            table_name TEXT PRIMARY KEY,
+            generation INTEGER NOT NULL
+        ) WITHOUT ROWID
+        """,
+    )
+    PRAGMAS = (
+        "PRAGMA journal_mode = WAL",
+        "PRAGMA synchronous = NORMAL",
+        "PRAGMA busy_timeout = 5000",
+        "PRAGMA foreign_keys = ON",
+    )
+    # Entries are counted (and trimmed) once every this many writes
+    TRIM_EVERY = 100
+
+    def __init__(self, path='query_cache.db', max_size=100000):
+        self.path = path
+        self.max_size = max_size
+        self._local = threading.local()
+        self._writes = 0
+        self.metrics = {'evictions': 0, 'invalidations': 0}
+        with self._transaction() as conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, isolation_level=None)
+            for pragma in self.PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _transaction(self):
+        return _Transaction(self._conn())
+
+    def generation(self):
+        return self._conn().execute(
+            "SELECT COALESCE(MAX(generation), 0) FROM generations").fetchone()[0]
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT expires_at, stale_until, value FROM entries WHERE key = ?",
+            (digest(key),)).fetchone()
+        if row is None:
+            return None
+        try:
+            return row[0], row[1], loads(row[2])
+        except (ValueError, EOFError, TypeError):
+            self.delete(key)
+            return None
+
+    def set(self, key, value, tables, expires_at, stale_until, generation=None):
+        try:
+            data = dumps(value)
+        except ValueError:
+            return
+        key_digest = digest(key)
+        tables = list(tables)
+        with self._transaction() as conn:
+            if generation is not None and tables:
+                raced = conn.execute(
+                    f"SELECT 1 FROM generations WHERE generation > ? AND table_name IN "
+                    f"({', '.join('?' * len(tables))}) LIMIT 1", [generation] + tables).fetchone()
+                if raced:
+                    return
+            conn.execute("DELETE FROM entries WHERE key = ?", (key_digest,))
+            conn.execute("INSERT INTO entries VALUES (?, ?, ?, ?)",
+                         (key_digest, expires_at, stale_until, data))
+            conn.executemany("INSERT INTO entry_tables VALUES (?, ?)",
+                             [(table, key_digest) for table in tables])
+        self._writes += 1
+        if self._writes % self.TRIM_EVERY == 0:
+            self._trim()
+
+    def _trim(self):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM entries WHERE stale_until < ?", (time.time(),))
+            excess = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_size
+            if excess > 0:
+                conn.execute("""
+                    DELETE FROM entries WHERE key IN (
+                        SELECT key FROM entries ORDER BY stale_until LIMIT ?
+                    )
+                """, (excess,))
+                self.metrics['evictions'] += excess
+
+    def delete(self, key):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM entries WHERE key = ?", (digest(key),))
+
+    def invalidate(self, tables):
+        tables = list(tables)
+        if not tables:
+            return
+        placeholders = ', '.join('?' * len(tables))
+        with self._transaction() as conn:
+            generation = conn.execute(
+                "SELECT COALESCE(MAX(generation), 0) + 1 FROM generations").fetchone()[0]
+            conn.executemany("""
+                INSERT INTO generations VALUES (?, ?)
+                ON CONFLICT (table_name) DO UPDATE SET generation = excluded.generation
+            """, [(table, generation) for table in tables])
+            removed = conn.execute(f"""
+                DELETE FROM entries WHERE key IN (
+                    SELECT key FROM entry_tables WHERE table_name IN ({placeholders})
+                )
+            """, tables).rowcount
+        self.metrics['invalidations'] += removed
+
+    def clear(self):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM entries")
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+class _Transaction:
+    """Runs a block in one immediate transaction on an autocommit sqlite3 connection"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.conn.execute("COMMIT" if exc_type is None else "ROLLBACK")
+
+
+BACKENDS = {
+    'memory': MemoryBackend,
+    'shm': SharedMemoryBackend,
+    'sqlite': SQLiteBackend,
+}
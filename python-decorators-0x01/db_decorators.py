@@ -0,0 +1,1081 @@
+import asyncio
+import atexit
+import contextlib
+import functools
+import inspect
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+
+from cache_backends import BACKENDS, MemoryBackend
+
+DATABASE = 'users.db'
+
+# Applied to every new connection
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16384",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA foreign_keys = ON",
+)
+
+
+class PoolError(Exception):
+    """Raised when no pooled connection becomes free in time"""
+
+
+class StatementStats:
+    """Per-connection record of which statements had to be prepared
+
+    Mirrors sqlite3's own LRU statement cache (cached_statements), so an
+    execute of SQL that is not in it counts as a prepare and one that is
+    counts as a reuse. Changing the connection's authorizer (track_tables
+    does) makes SQLite parse every statement again, so expire() forgets
+    them all. Comparing the average time of the two shows what parsing
+    costs.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._recent = OrderedDict()
+        self.metrics = {
+            'prepares': 0,
+            'reuses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'prepare_seconds': 0.0,
+            'reuse_seconds': 0.0,
+        }
+
+    def expire(self):
+        """Records that every prepared statement has to be parsed again"""
+        self._recent.clear()
+        self.metrics['expirations'] += 1
+
+    def record(self, sql, seconds):
+        if sql in self._recent:
+            self._recent.move_to_end(sql)
+            self.metrics['reuses'] += 1
+            self.metrics['reuse_seconds'] += seconds
+            return
+        self.metrics['prepares'] += 1
+        self.metrics['prepare_seconds'] += seconds
+        if self.size:
+            self._recent[sql] = None
+            if len(self._recent) > self.size:
+                self._recent.popitem(last=False)
+                self.metrics['evictions'] += 1
+
+
+class StatementCursor(sqlite3.Cursor):
+    """Cursor that times each execute into its connection's StatementStats"""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self.connection.statements.record(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self.connection.statements.record(sql, time.perf_counter() - start)
+
+
+class StatementConnection(sqlite3.Connection):
+    """sqlite3 connection whose cursors report to a StatementStats"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.statements = StatementStats(kwargs.get('cached_statements', 128))
+
+    def cursor(self, factory=StatementCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class ConnectionPool:
+    """Thread-safe pool of SQLite connections
+
+    At most `size` connections are open at once. A thread gets back the
+    connection it used last whenever that one is idle, so SQLite's page
+    cache stays warm for it. Each connection keeps its last
+    `statement_cache_size` statements prepared; with statement_stats=True
+    its cursors also record prepares and reuses (see statement_metrics).
+    `metrics` counts checkouts, waits for a free connection and
+    connections created.
+    """
+
+    def __init__(self, database=DATABASE, size=5, checkout_timeout=30, pragmas=PRAGMAS,
+                 statement_cache_size=128, statement_stats=False):
+        self.database = database
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self.pragmas = pragmas
+        self.statement_cache_size = statement_cache_size
+        self.statement_stats = statement_stats
+        self._connections = []
+        self._idle = []
+        self._open = 0
+        self._local = threading.local()
+        self._available = threading.Condition()
+        self.metrics = {'checkouts': 0, 'waits': 0, 'created': 0}
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, check_same_thread=False,
+                               cached_statements=self.statement_cache_size,
+                               factory=StatementConnection if self.statement_stats
+                               else sqlite3.Connection)
+        for pragma in self.pragmas:
+            conn.execute(pragma)
+        return conn
+
+    def statement_metrics(self):
+        """Returns StatementStats totals over every connection the pool opened
+
+        Adds avg_prepare_us and avg_reuse_us; their difference is roughly
+        the cost of parsing a statement.
+        """
+        with self._available:
+            connections = list(self._connections)
+        totals = dict.fromkeys(('prepares', 'reuses', 'evictions', 'expirations'), 0)
+        totals.update(prepare_seconds=0.0, reuse_seconds=0.0)
+        for conn in connections:
+            if not isinstance(conn, StatementConnection):
+                continue
+            for name, value in conn.statements.metrics.items():
+                totals[name] += value
+        totals['avg_prepare_us'] = (
+            totals['prepare_seconds'] / totals['prepares'] * 1e6 if totals['prepares'] else 0.0)
+        totals['avg_reuse_us'] = (
+            totals['reuse_seconds'] / totals['reuses'] * 1e6 if totals['reuses'] else 0.0)
+        return totals
+
+    def get_connection(self):
+        """Checks out a connection, preferring the one this thread used last"""
+        deadline = time.monotonic() + self.checkout_timeout
+        preferred = getattr(self._local, 'connection', None)
+        with self._available:
+            idle = self._idle
+            while True:
+                if idle:
+                    # The last connection released is usually this thread's own
+                    index = len(idle) - 1
+                    while index and idle[index] is not preferred:
+                        index -= 1
+                    if idle[index] is not preferred:
+                        index = len(idle) - 1
+                    conn = idle.pop(index)
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    conn = None
+                    break
+                self.metrics['waits'] += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._available.wait(remaining):
+                    raise PoolError("Connection pool exhausted")
+            self.metrics['checkouts'] += 1
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except BaseException:
+                with self._available:
+                    self._open -= 1
+                    self._available.notify()
+                raise
+            with self._available:
+                self.metrics['created'] += 1
+                self._connections.append(conn)
+        self._local.connection = conn
+        return conn
+
+    def release(self, conn):
+        """Returns a connection to the pool, rolling back anything left open"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            with self._available:
+                self._connections.remove(conn)
+                self._open -= 1
+                self._available.notify()
+            return
+        with self._available:
+            self._idle.append(conn)
+            self._available.notify()
+
+    def close(self):
+        """Closes every idle connection"""
+        with self._available:
+            idle = self._idle[:]
+            self._idle.clear()
+            self._open -= len(idle)
+            self._connections = [c for c in self._connections
+                                 if not any(c is conn for conn in idle)]
+        for conn in idle:
+            conn.close()
+
+
+_pool = None
+_pool_pid = None
+_pool_options = {}
+_pool_lock = threading.Lock()
+
+
+def configure(**options):
+    """Sets the options of the shared pool
+
+    Options are ConnectionPool's: database, size, checkout_timeout, pragmas
+    and statement_cache_size.
+    """
+    global _pool
+    with _pool_lock:
+        _pool_options.clear()
+        _pool_options.update(options)
+        if _pool is not None:
+            _pool.close()
+        _pool = None
+
+
+def get_pool():
+    """Returns the process-wide connection pool, creating it on first use"""
+    global _pool, _pool_pid
+    with _pool_lock:
+        # Connections inherited through fork must not be shared with the parent
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ConnectionPool(**_pool_options)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+# The GroupCommit open on each thread, if any
+_groups = threading.local()
+
+
+def with_db_connection(func):
+    """Decorator that passes a pooled connection as the first argument
+
+    Inside a group_commit() block the block's connection is passed instead.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        group = getattr(_groups, 'current', None)
+        if group is not None:
+            return func(group.conn, *args, **kwargs)
+        pool = get_pool()
+        conn = pool.get_connection()
+        try:
+            return func(conn, *args, **kwargs)
+        finally:
+            pool.release(conn)
+    return wrapper
+
+
+_WRITE_ACTIONS = (sqlite3.SQLITE_INSERT, sqlite3.SQLITE_UPDATE, sqlite3.SQLITE_DELETE)
+_trackers = {}
+
+
+def _authorize(trackers, action, arg1, arg2, db_name, trigger):
+    if arg1 and not arg1.startswith('sqlite_'):
+        if action == sqlite3.SQLITE_READ:
+            for reads, _ in trackers:
+                reads.add(arg1)
+        elif action in _WRITE_ACTIONS:
+            for _, writes in trackers:
+                writes.add(arg1)
+    return sqlite3.SQLITE_OK
+
+
+def _set_authorizer(conn, authorizer):
+    conn.set_authorizer(authorizer)
+    # SQLite expires every prepared statement when the authorizer changes
+    statements = getattr(conn, 'statements', None)
+    if statements is not None:
+        statements.expire()
+
+
+@contextlib.contextmanager
+def track_tables(conn):
+    """Context manager yielding the (reads, writes) table sets of statements run on conn
+
+    Uses SQLite's authorizer hook, which sees every table a statement
+    touches when it is prepared. Installing it expires the connection's
+    prepared statements, so ones already cached are prepared again (and
+    seen) on their next use. Trackers on the same connection nest, and
+    each one entered re-installs the hook for that reason.
+    """
+    tracker = (set(), set())
+    trackers = _trackers.setdefault(id(conn), [])
+    trackers.append(tracker)
+    _set_authorizer(conn, functools.partial(_authorize, trackers))
+    try:
+        yield tracker
+    finally:
+        # Trackers with the same tables compare equal, so remove by identity
+        trackers[:] = [t for t in trackers if t is not tracker]
+        if not trackers:
+            del _trackers[id(conn)]
+            _set_authorizer(conn, None)
+
+
+_MISSING = object()
+
+
+class _Flight:
+    """A load in progress that other callers for the same key wait on"""
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# Every QueryCache, so writes can invalidate caches passed to cache_query(cache=...)
+_caches = weakref.WeakSet()
+
+
+class QueryCache:
+    """Thread-safe cache of query results with a per-entry TTL
+
+    Entries live in a storage backend from cache_backends: the in-process
+    LRU (default), a memory-mapped table shared by the processes on a host,
+    or a SQLite file that survives restarts. Each entry remembers the
+    tables its query read, so invalidate() drops every result that depends
+    on a table that was written; with a shared backend that reaches other
+    processes too. With a stale_ttl, expired entries are still served for
+    that many seconds while they are refreshed. load() makes concurrent
+    misses for one key in this process share a single execution. `metrics`
+    counts hits, stale_hits, misses, coalesced (misses that waited on
+    another caller's load) and expirations (TTL), plus the backend's
+    evictions and invalidations.
+    """
+
+    def __init__(self, max_size=1024, ttl=300, stale_ttl=0, backend=None):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.backend = MemoryBackend(max_size) if backend is None else backend
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._counts = {
+            'hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'expirations': 0,
+        }
+        _caches.add(self)
+
+    @property
+    def metrics(self):
+        return {**self._counts, **self.backend.metrics}
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def generation(self):
+        """Returns a token to pass to set(), taken before the query runs"""
+        return self.backend.generation()
+
+    def lookup(self, key):
+        """Returns (value, stale) for key, or (_MISSING, False) on a miss
+
+        stale is True for an expired entry still inside its stale_ttl.
+        """
+        entry = self.backend.get(key)
+        if entry is None:
+            self._count('misses')
+            return _MISSING, False
+        expires_at, stale_until, value = entry
+        now = time.time()
+        if expires_at > now:
+            self._count('hits')
+            return value, False
+        if stale_until > now:
+            self._count('stale_hits')
+            return value, True
+        self.backend.delete(key)
+        self._count('expirations')
+        self._count('misses')
+        return _MISSING, False
+
+    def get(self, key, default=None):
+        """Returns the cached result for key (possibly stale), or default on a miss"""
+        value, _ = self.lookup(key)
+        return default if value is _MISSING else value
+
+    def set(self, key, value, tables=(), ttl=None, generation=None, stale_ttl=None):
+        """Caches value under key until it expires or one of `tables` is written
+
+        With a generation from generation(), the value is dropped if one of
+        its tables was invalidated while the query was running. Shared
+        backends skip values they can't serialize.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        stale_ttl = self.stale_ttl if stale_ttl is None else stale_ttl
+        expires_at = time.time() + ttl
+        self.backend.set(key, value, frozenset(tables), expires_at, expires_at + stale_ttl,
+                         generation)
+
+    def load(self, key, loader, wait=True):
+        """Runs loader() for key unless a load for it is already running
+
+        Callers that find a load running wait for it and get its result or
+        exception instead of running loader themselves; with wait=False
+        they return None at once.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            elif wait:
+                self._counts['coalesced'] += 1
+        if not leader:
+            if not wait:
+                return None
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = loader()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+    def loading(self, key):
+        """Returns True while a load() for key is running"""
+        return key in self._flights
+
+    def invalidate(self, tables):
+        """Drops every cached result that read one of the given tables"""
+        if tables:
+            self.backend.invalidate(tables)
+
+    def clear(self):
+        self.backend.clear()
+
+    def __len__(self):
+        return len(self.backend)
+
+
+def invalidate_caches(tables):
+    """Drops every result that read one of the given tables from every QueryCache"""
+    if tables:
+        for cache in list(_caches):
+            cache.invalidate(tables)
+
+
+query_cache = QueryCache()
+cache_logger = logging.getLogger('db_decorators.cache')
+
+
+def configure_cache(backend='memory', **options):
+    """Moves query_cache to another storage backend, dropping what it held
+
+    backend is 'memory' (in-process LRU; option max_size), 'shm' (shared
+    by the processes on this host; options path, slots, slot_size) or
+    'sqlite' (kept across restarts; options path, max_size). Call it at
+    startup, before worker processes are forked.
+    """
+    query_cache.backend = BACKENDS[backend](**options)
+
+
+def _freeze(value):
+    """Turns lists, tuples and dicts into hashable tuples for use in cache keys"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+
+def _run_and_cache(store, key, func, conn, args, kwargs, ttl, stale_ttl):
+    generation = store.generation()
+    with track_tables(conn) as (reads, _):
+        result = func(conn, *args, **kwargs)
+    store.set(key, result, reads, ttl, generation, stale_ttl)
+    return result
+
+
+def _refresh(store, key, func, args, kwargs, ttl, stale_ttl):
+    """Re-runs a query on its own pooled connection in a background thread"""
+    def reload():
+        pool = get_pool()
+        conn = pool.get_connection()
+        try:
+            return _run_and_cache(store, key, func, conn, args, kwargs, ttl, stale_ttl)
+        finally:
+            pool.release(conn)
+
+    def run():
+        try:
+            store.load(key, reload, wait=False)
+        except Exception as e:
+            # The stale entry keeps being served until its stale_ttl runs out
+            cache_logger.warning("Refreshing %s failed: %s", func.__qualname__, e)
+
+    if not store.loading(key):
+        threading.Thread(target=run, daemon=True).start()
+
+
+def cache_query(func=None, *, ttl=None, stale_ttl=None, cache=None):
+    """Decorator that caches results by query text and parameters
+
+    Used bare (@cache_query) or with options (@cache_query(ttl=60)). The
+    decorated function takes the connection first; every other argument is
+    part of the cache key. Results are dropped after `ttl` seconds or when
+    a transactional call writes a table the query read. Concurrent misses
+    for the same key run the query once. With stale_ttl, an expired result
+    is returned for up to that many more seconds while a background thread
+    refreshes it.
+    """
+    if func is None:
+        return functools.partial(cache_query, ttl=ttl, stale_ttl=stale_ttl, cache=cache)
+
+    @functools.wraps(func)
+    def wrapper(conn, *args, **kwargs):
+        store = query_cache if cache is None else cache
+        key = (func.__module__, func.__qualname__, _freeze(args), _freeze(kwargs))
+        result, stale = store.lookup(key)
+        if result is not _MISSING:
+            if stale:
+                _refresh(store, key, func, args, kwargs, ttl, stale_ttl)
+            return result
+        return store.load(
+            key, lambda: _run_and_cache(store, key, func, conn, args, kwargs, ttl, stale_ttl))
+    return wrapper
+
+
+def transactional(func):
+    """Decorator that commits on success and rolls back on error
+
+    Cached query results that read a table written by the call are
+    invalidated once it commits or rolls back. Inside a group_commit() block the call
+    runs in a savepoint of the group's transaction instead.
+    """
+    @functools.wraps(func)
+    def wrapper(conn, *args, **kwargs):
+        group = getattr(_groups, 'current', None)
+        if group is not None and group.conn is conn:
+            return group.run(func, conn, *args, **kwargs)
+        with track_tables(conn) as (_, writes):
+            try:
+                result = func(conn, *args, **kwargs)
+                conn.commit()
+                print("[TRANSACTION] Committed successfully.")
+            except Exception as e:
+                conn.rollback()
+                print(f"[TRANSACTION] Rolled back due to error: {e}")
+                # Results cached from inside the transaction saw its writes
+                invalidate_caches(writes)
+                raise
+        invalidate_caches(writes)
+        return result
+    return wrapper
+
+
+class GroupCommit:
+    """One thread's shared write transaction, opened by group_commit()
+
+    Each transactional call runs in its own SAVEPOINT, so a failing call
+    only undoes its own statements. The transaction is committed once
+    max_ops calls have succeeded, when the block ends, and by a timer
+    max_delay seconds after its first write, so an idle block never keeps
+    SQLite's write lock longer than that. A lock keeps the timer from
+    committing in the middle of a call.
+    """
+
+    def __init__(self, conn, writes, max_ops=500, max_delay=0.005):
+        self.conn = conn
+        # Tables written since the block began, recorded by its track_tables()
+        self.writes = writes
+        self.max_ops = max_ops
+        self.max_delay = max_delay
+        self.ops = 0
+        self.started = None
+        self.closed = False
+        self._lock = threading.RLock()
+        self._timer = None
+        self.metrics = {'ops': 0, 'failed_ops': 0, 'commits': 0}
+
+    def run(self, func, conn, *args, **kwargs):
+        with self._lock:
+            if not conn.in_transaction:
+                conn.execute("BEGIN")
+            if self.started is None:
+                # A write outside transactional may already have opened the transaction
+                self.started = time.monotonic()
+            conn.execute("SAVEPOINT transactional")
+            try:
+                result = func(conn, *args, **kwargs)
+            except Exception as e:
+                conn.execute("ROLLBACK TO transactional")
+                conn.execute("RELEASE transactional")
+                self.metrics['failed_ops'] += 1
+                print(f"[TRANSACTION] Rolled back one write due to error: {e}")
+                raise
+            finally:
+                self._schedule()
+            conn.execute("RELEASE transactional")
+            self.ops += 1
+            self.metrics['ops'] += 1
+            if self.ops >= self.max_ops or time.monotonic() - self.started >= self.max_delay:
+                self.commit()
+            return result
+
+    def _schedule(self):
+        if self._timer is None and self.conn.in_transaction:
+            delay = max(0.0, self.started + self.max_delay - time.monotonic())
+            self._timer = threading.Timer(delay, self._flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush(self):
+        with self._lock:
+            self._timer = None
+            if not self.closed:
+                self.commit()
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def commit(self):
+        with self._lock:
+            self._cancel_timer()
+            if self.conn.in_transaction:
+                self.conn.commit()
+                self.metrics['commits'] += 1
+                print(f"[TRANSACTION] Committed {self.ops} writes.")
+            # A cached statement reports its tables only when first prepared,
+            # so every table written in the block is invalidated each time
+            invalidate_caches(list(self.writes))
+            self.ops = 0
+            self.started = None
+
+    def rollback(self):
+        with self._lock:
+            self._cancel_timer()
+            self.conn.rollback()
+            invalidate_caches(list(self.writes))
+            self.ops = 0
+            self.started = None
+
+    def close(self):
+        """Commits what is pending and stops the timer; used when the block ends"""
+        with self._lock:
+            try:
+                self.commit()
+            except sqlite3.Error:
+                self.rollback()
+                raise
+            finally:
+                self.closed = True
+                self._cancel_timer()
+
+
+@contextlib.contextmanager
+def group_commit(max_ops=500, max_delay=0.005):
+    """Context manager that groups the transactional calls in its block into shared commits
+
+    The block's calls on this thread use one pooled connection, and their
+    writes are committed together (see GroupCommit), so a loop of small
+    updates pays for one commit per group instead of one per call. A
+    write is only durable once its group commits. A failing call only
+    undoes its own statements: when an exception leaves the block, the
+    calls that succeeded are still committed before it propagates. Nested
+    blocks join the outer one.
+    """
+    group = getattr(_groups, 'current', None)
+    if group is not None:
+        yield group
+        return
+    pool = get_pool()
+    conn = pool.get_connection()
+    try:
+        with track_tables(conn) as (_, writes):
+            group = GroupCommit(conn, writes, max_ops, max_delay)
+            _groups.current = group
+            try:
+                yield group
+            finally:
+                _groups.current = None
+                group.close()
+    finally:
+        pool.release(conn)
+
+
+_STRING_LITERALS = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERALS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=1024)
+def fingerprint(query):
+    """Returns the query with literals replaced by ? and whitespace collapsed"""
+    query = _STRING_LITERALS.sub('?', query)
+    query = _NUMBER_LITERALS.sub('?', query)
+    query = _PLACEHOLDER_LISTS.sub('(...)', query)
+    return _SPACES.sub(' ', query).strip()
+
+
+def _row_count(result):
+    if result is None:
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, tuple):
+        # fetchone() returns a single row
+        return 1
+    return None
+
+
+class QueryLog:
+    """In-process record of query executions
+
+    record() only appends to a pending queue; a background thread folds
+    pending executions into a ring buffer of the last `ring_size` ones and
+    per-fingerprint histograms of wall time (power-of-two microsecond
+    buckets), and writes them to the 'db_decorators.queries' logger:
+    queries slower than slow_query_seconds and failed ones at WARNING, the
+    rest at DEBUG. Successful executions are recorded with probability
+    sample_rate; errors always are. If the thread falls more than
+    max_pending executions behind, the oldest are dropped.
+    """
+
+    def __init__(self, ring_size=1000, sample_rate=1.0, slow_query_seconds=0.1,
+                 flush_interval=1.0, max_pending=100000, logger=None):
+        self.enabled = True
+        self.sample_rate = sample_rate
+        self.slow_query_seconds = slow_query_seconds
+        self.flush_interval = flush_interval
+        self.logger = logger or logging.getLogger('db_decorators.queries')
+        self.events = deque(maxlen=ring_size)
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._pending = deque(maxlen=max_pending)
+        self._flusher_started = False
+        # A thread started before fork doesn't exist in the child
+        os.register_at_fork(after_in_child=self._forget_flusher)
+
+    def record(self, query, wall, cpu, rows, error=None):
+        """Queues one execution for the background thread"""
+        self._pending.append((time.time(), query, wall, cpu, rows, error))
+        if not self._flusher_started:
+            self._start_flusher()
+
+    def _forget_flusher(self):
+        self._lock = threading.Lock()
+        self._flusher_started = False
+
+    def _start_flusher(self):
+        with self._lock:
+            if self._flusher_started:
+                return
+            self._flusher_started = True
+            threading.Thread(target=self._flush_loop, daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Folds pending executions into the histograms and writes them to the logger"""
+        logged = []
+        with self._lock:
+            while True:
+                try:
+                    created, query, wall, cpu, rows, error = self._pending.popleft()
+                except IndexError:
+                    break
+                event = (created, fingerprint(query), wall, cpu, rows, error)
+                self.events.append(event)
+                # count, errors, wall, cpu, max wall, rows, histogram
+                stats = self._stats.get(event[1])
+                if stats is None:
+                    stats = self._stats[event[1]] = [0, 0, 0.0, 0.0, 0.0, 0, []]
+                stats[0] += 1
+                if error is not None:
+                    stats[1] += 1
+                stats[2] += wall
+                stats[3] += cpu
+                stats[4] = max(stats[4], wall)
+                stats[5] += rows or 0
+                bucket = int(wall * 1e6).bit_length()
+                histogram = stats[6]
+                if len(histogram) <= bucket:
+                    histogram.extend([0] * (bucket + 1 - len(histogram)))
+                histogram[bucket] += 1
+
+                level = logging.WARNING if error or wall >= self.slow_query_seconds else logging.DEBUG
+                if self.logger.isEnabledFor(level):
+                    logged.append((level, event))
+
+        for level, (created, query, wall, cpu, rows, error) in logged:
+            self.logger.log(
+                level, "%s (%.3f ms, %s rows%s)", query, wall * 1e3, rows,
+                f", error: {error}" if error else "",
+                extra={'query': {
+                    'created': created,
+                    'fingerprint': query,
+                    'wall_seconds': wall,
+                    'cpu_seconds': cpu,
+                    'rows': rows,
+                    'error': error,
+                }})
+
+    def percentile(self, query, percent):
+        """Returns the upper bound in seconds of the bucket holding the percentile"""
+        self.flush()
+        with self._lock:
+            return self._percentile(self._stats.get(fingerprint(query)), percent)
+
+    @staticmethod
+    def _percentile(stats, percent):
+        if stats is None:
+            return None
+        rank = stats[0] * percent / 100
+        seen = 0
+        for bucket, count in enumerate(stats[6]):
+            seen += count
+            if seen >= rank:
+                return (1 << bucket) / 1e6
+        return None
+
+    def summary(self):
+        """Returns per-fingerprint totals, slowest total wall time first"""
+        self.flush()
+        with self._lock:
+            stats = {query: {
+                'count': values[0],
+                'errors': values[1],
+                'wall_seconds': values[2],
+                'cpu_seconds': values[3],
+                'max_seconds': values[4],
+                'rows': values[5],
+                'histogram': list(values[6]),
+                'p50_seconds': self._percentile(values, 50),
+                'p99_seconds': self._percentile(values, 99),
+            } for query, values in self._stats.items()}
+        return dict(sorted(stats.items(), key=lambda item: -item[1]['wall_seconds']))
+
+    def reset(self):
+        with self._lock:
+            self._pending.clear()
+            self.events.clear()
+            self._stats.clear()
+
+
+query_log = QueryLog()
+atexit.register(query_log.flush)
+
+
+def log_queries(func):
+    """Decorator that records each call's query, duration, rows and errors in query_log
+
+    The query is the `query` keyword argument; calls without one are
+    recorded under the function's name.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        log = query_log
+        if not log.enabled:
+            return func(*args, **kwargs)
+        sampled = log.sample_rate >= 1 or random.random() < log.sample_rate
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            log.record(_query_argument(func, kwargs), time.perf_counter() - wall_start,
+                       time.thread_time() - cpu_start, None, f"{type(e).__name__}: {e}")
+            raise
+        if sampled:
+            log.record(_query_argument(func, kwargs), time.perf_counter() - wall_start,
+                       time.thread_time() - cpu_start, _row_count(result))
+        return result
+    return wrapper
+
+
+def _query_argument(func, kwargs):
+    # Other string arguments are usually values (emails, names) rather than
+    # SQL, and would put them in the log and split the fingerprints
+    query = kwargs.get('query')
+    if isinstance(query, str):
+        return query
+    return func.__qualname__
+
+
+# sqlite3.OperationalError messages worth retrying: another connection holds a lock
+TRANSIENT_ERRORS = ('database is locked', 'database table is locked', 'database is busy')
+
+
+def is_transient(error):
+    """Returns True for errors that are likely to succeed if retried"""
+    return (isinstance(error, sqlite3.OperationalError)
+            and any(message in str(error).lower() for message in TRANSIENT_ERRORS))
+
+
+class RetryBudget:
+    """Token bucket that caps retries at a fraction of successful calls
+
+    Every retry spends a token and every successful call earns `ratio` of
+    one, up to max_tokens. While the database is down nothing is earned,
+    so once the bucket is empty callers fail fast instead of joining a
+    retry storm.
+    """
+
+    def __init__(self, ratio=0.1, max_tokens=10):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def spend(self):
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def earn(self):
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+
+retry_budget = RetryBudget()
+retry_logger = logging.getLogger('db_decorators.retry')
+
+
+class RetryPolicy:
+    """Decorator that retries transient failures with exponential backoff
+
+    A call is tried at most `attempts` times. Before retry n it sleeps a
+    random time between 0 and min(max_delay, base_delay * 2 ** n) (full
+    jitter), so callers that failed together don't retry together. Only
+    errors for which retry_on(error) is true are retried, and each retry
+    needs a token from the shared budget. Coroutine functions get an async
+    wrapper that awaits instead of sleeping. `metrics` counts calls,
+    attempts, retries, give_ups and budget_exhausted.
+    """
+
+    def __init__(self, attempts=3, base_delay=0.05, max_delay=2.0, retry_on=is_transient,
+                 budget=retry_budget):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_on = retry_on
+        self.budget = budget
+        self._lock = threading.Lock()
+        self.metrics = {
+            'calls': 0,
+            'attempts': 0,
+            'retries': 0,
+            'give_ups': 0,
+            'budget_exhausted': 0,
+        }
+
+    def _count(self, metric):
+        with self._lock:
+            self.metrics[metric] += 1
+
+    def backoff(self, retry):
+        """Returns the sleep before the given retry (0 for the first)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+    def _should_retry(self, func, error, attempt):
+        if attempt >= self.attempts or not self.retry_on(error):
+            self._count('give_ups')
+            retry_logger.warning("%s failed after %d attempt(s): %s",
+                                 func.__qualname__, attempt, error)
+            return False
+        if self.budget is not None and not self.budget.spend():
+            self._count('budget_exhausted')
+            self._count('give_ups')
+            retry_logger.warning("%s not retried, retry budget exhausted: %s",
+                                 func.__qualname__, error)
+            return False
+        self._count('retries')
+        retry_logger.info("%s attempt %d failed, retrying: %s", func.__qualname__, attempt, error)
+        return True
+
+    def _succeeded(self):
+        if self.budget is not None:
+            self.budget.earn()
+
+    def __call__(self, func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                self._count('calls')
+                attempt = 0
+                while True:
+                    attempt += 1
+                    self._count('attempts')
+                    try:
+                        result = await func(*args, **kwargs)
+                    except Exception as e:
+                        if not self._should_retry(func, e, attempt):
+                            raise
+                        await asyncio.sleep(self.backoff(attempt - 1))
+                        continue
+                    self._succeeded()
+                    return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            self._count('calls')
+            attempt = 0
+            while True:
+                attempt += 1
+                self._count('attempts')
+                try:
+                    result = func(*args, **kwargs)
+                except Exception as e:
+                    if not self._should_retry(func, e, attempt):
+                        raise
+                    time.sleep(self.backoff(attempt - 1))
+                    continue
+                self._succeeded()
+                return result
+        return wrapper
+
+
+def retry_on_failure(retries=3, delay=2, **options):
+    """Decorator factory kept for the task files: a RetryPolicy of `retries` attempts
+
+    delay is the base delay of the backoff; other options go to RetryPolicy.
+    """
+    return RetryPolicy(attempts=retries, base_delay=delay, **options)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""Unit tests for the cache_backends module."""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import cache_backends
+from cache_backends import MemoryBackend, SharedMemoryBackend, SQLiteBackend
+
+
+def invalidate_in_child(backend_class: type, path: str, tables: list) -> None:
+    """Open the backend's file in another process and invalidate tables."""
+    backend_class(path=path).invalidate(tables)
+
+
+class BackendTestMixin:
+    """Checks every backend must pass; subclasses provide make_backend()."""
+
+    def setUp(self) -> None:
+        """Create a directory for the backend's files."""
+        self.tmp = tempfile.mkdtemp()
+        self.backend = self.make_backend()
+
+    def tearDown(self) -> None:
+        """Remove the backend's files."""
+        shutil.rmtree(self.tmp)
+
+    def put(self, key: str, value: object, tables: list, generation: object = None) -> None:
+        """Store value under key for a minute."""
+        now = time.time()
+        self.backend.set(key, value, tables, now + 60, now + 60, generation)
+
+    def test_get_returns_stored_rows(self) -> None:
+        """Test a stored result comes back with its expiry times."""
+        self.put('q1', [(1, 'a')], ['users'])
+        expires_at, stale_until, value = self.backend.get('q1')
+        self.assertEqual(list(value), [(1, 'a')])
+        self.assertGreater(expires_at, time.time())
+        self.assertIsNone(self.backend.get('q2'))
+
+    def test_invalidate_drops_entries_of_written_tables(self) -> None:
+        """Test writing a table invalidates only the entries that read it."""
+        self.put('q1', [(1,)], ['users'])
+        self.put('q2', [(2,)], ['orders'])
+        self.backend.invalidate(['users'])
+        self.assertIsNone(self.backend.get('q1'))
+        self.assertIsNotNone(self.backend.get('q2'))
+
+    def test_set_after_racing_write_is_dropped(self) -> None:
+        """Test a result read before a write to its table is not cached."""
+        generation = self.backend.generation()
+        self.backend.invalidate(['users'])
+        self.put('q1', [(1,)], ['users'], generation)
+        self.assertIsNone(self.backend.get('q1'))
+
+
+class TestMemoryBackend(BackendTestMixin, unittest.TestCase):
+    """Test case for MemoryBackend."""
+
+    def make_backend(self) -> MemoryBackend:
+        """Return an in-process backend."""
+        return MemoryBackend()
+
+
+class SharedBackendTestMixin(BackendTestMixin):
+    """Checks for backends shared by several processes."""
+
+    def test_set_after_write_in_other_process_is_dropped(self) -> None:
+        """Test the generation guard sees a write made by another process."""
+        generation = self.backend.generation()
+        child = multiprocessing.get_context('fork').Process(
+            target=invalidate_in_child, args=(type(self.backend), self.path, ['users']))
+        child.start()
+        child.join()
+        self.assertEqual(child.exitcode, 0)
+        self.put('q1', [(1,)], ['users'], generation)
+        self.assertIsNone(self.backend.get('q1'))
+        self.put('q2', [(2,)], ['users'], self.backend.generation())
+        self.assertIsNotNone(self.backend.get('q2'))
+
+    def test_other_process_sees_entries(self) -> None:
+        """Test an entry stored by one process is read by another instance."""
+        self.put('q1', [(1, 'a')], ['users'])
+        other = type(self.backend)(path=self.path)
+        self.assertEqual(list(other.get('q1')[2]), [(1, 'a')])
+
+
+class TestSharedMemoryBackend(SharedBackendTestMixin, unittest.TestCase):
+    """Test case for SharedMemoryBackend."""
+
+    def make_backend(self) -> SharedMemoryBackend:
+        """Return a small shared backend in the test directory."""
+        self.path = os.path.join(self.tmp, 'cache')
+        return SharedMemoryBackend(path=self.path, slots=64, slot_size=512)
+
+    def test_default_path_names_the_user(self) -> None:
+        """Test the default file is per user."""
+        self.assertTrue(cache_backends._default_shm_path().endswith(f'.{os.getuid()}'))
+
+    def test_file_of_other_user_is_refused(self) -> None:
+        """Test a file owned by another user is not opened."""
+        with patch.object(cache_backends.os, 'getuid', return_value=os.getuid() + 1):
+            with self.assertRaises(PermissionError):
+                SharedMemoryBackend(path=self.path)
+
+    def test_foreign_file_is_refused_not_truncated(self) -> None:
+        """Test a file without the cache header is left untouched."""
+        path = os.path.join(self.tmp, 'other')
+        with open(path, 'wb') as f:
+            f.write(b'not a cache file')
+        with self.assertRaises(ValueError):
+            SharedMemoryBackend(path=path)
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b'not a cache file')
+
+    def test_symlink_is_refused(self) -> None:
+        """Test the cache file is not opened through a symlink."""
+        link = os.path.join(self.tmp, 'link')
+        os.symlink(self.path, link)
+        with self.assertRaises(OSError):
+            SharedMemoryBackend(path=link)
+
+
+class TestSQLiteBackend(SharedBackendTestMixin, unittest.TestCase):
+    """Test case for SQLiteBackend."""
+
+    def make_backend(self) -> SQLiteBackend:
+        """Return a backend stored in the test directory."""
+        self.path = os.path.join(self.tmp, 'cache.db')
+        return SQLiteBackend(path=self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Unit tests for group commits and query logging in the db_decorators module."""
+
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+import db_decorators
+from db_decorators import (cache_query, group_commit, log_queries, query_cache, query_log,
+                           transactional, with_db_connection)
+
+
+@with_db_connection
+@cache_query
+def get_email(conn, user_id):
+    return conn.execute("SELECT email FROM users WHERE id = ?", (user_id,)).fetchall()
+
+
+@with_db_connection
+@transactional
+def set_email(conn, user_id, email):
+    conn.execute("UPDATE users SET email = ? WHERE id = ?", (email, user_id))
+
+
+@with_db_connection
+def set_name(conn, user_id, name):
+    conn.execute("UPDATE users SET name = ? WHERE id = ?", (name, user_id))
+
+
+class TestGroupCommit(unittest.TestCase):
+    """Test case for cached reads and plain writes inside group_commit()."""
+
+    def setUp(self) -> None:
+        """Create a users table in a fresh database for the shared pool."""
+        fd, self.database = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        conn = sqlite3.connect(self.database)
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, name TEXT, email TEXT)")
+        conn.executemany("INSERT INTO users VALUES (?, ?, ?)",
+                         [(i, f"user{i}", f"user{i}@example.com") for i in range(1, 4)])
+        conn.commit()
+        conn.close()
+        db_decorators.configure(database=self.database)
+        query_cache.clear()
+
+    def tearDown(self) -> None:
+        """Close the pool and remove the database files."""
+        db_decorators.configure()
+        query_cache.clear()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.database + suffix):
+                os.remove(self.database + suffix)
+
+    def test_cached_read_in_group(self) -> None:
+        """Test a cached read leaves the group's table tracker in place."""
+        with group_commit():
+            self.assertEqual(get_email(1), [("user1@example.com",)])
+            set_email(1, "new1@example.com")
+        self.assertEqual(db_decorators._trackers, {})
+        self.assertEqual(get_email(1), [("new1@example.com",)])
+
+    def test_repeated_cached_read_in_group_is_invalidated(self) -> None:
+        """Test a read reusing a prepared statement still records its tables."""
+        with group_commit():
+            get_email(2)
+            get_email(3)
+            set_email(3, "new3@example.com")
+        self.assertEqual(get_email(3), [("new3@example.com",)])
+
+    def test_plain_write_before_transactional_call(self) -> None:
+        """Test a transaction opened outside transactional doesn't break the group."""
+        with group_commit() as group:
+            set_name(1, "renamed")
+            set_email(1, "new1@example.com")
+        self.assertEqual(group.metrics['ops'], 1)
+        self.assertIsNone(group.started)
+        self.assertEqual(get_email(1), [("new1@example.com",)])
+
+    def test_idle_group_releases_write_lock(self) -> None:
+        """Test pending writes are committed once max_delay passes without another call."""
+        with group_commit(max_delay=0.005) as group:
+            set_email(1, "new1@example.com")
+            time.sleep(0.05)
+            other = sqlite3.connect(self.database, timeout=0)
+            try:
+                other.execute("UPDATE users SET name = 'other' WHERE id = 2")
+                other.commit()
+                self.assertEqual(other.execute("SELECT email FROM users WHERE id = 1").fetchone(),
+                                 ("new1@example.com",))
+            finally:
+                other.close()
+        self.assertEqual(group.metrics['commits'], 1)
+
+    def test_exception_keeps_succeeded_writes(self) -> None:
+        """Test an exception leaving the block still commits the calls that succeeded."""
+        @with_db_connection
+        @transactional
+        def fail(conn):
+            conn.execute("UPDATE users SET email = 'lost' WHERE id = 2")
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            with group_commit(max_delay=60):
+                set_email(1, "new1@example.com")
+                fail()
+        self.assertEqual(get_email(1), [("new1@example.com",)])
+        self.assertEqual(get_email(2), [("user2@example.com",)])
+
+
+class TestLogQueries(unittest.TestCase):
+    """Test case for the query recorded by log_queries."""
+
+    def setUp(self) -> None:
+        """Start from an empty query log."""
+        query_log.reset()
+
+    def tearDown(self) -> None:
+        """Leave an empty query log behind."""
+        query_log.reset()
+
+    def test_query_keyword_is_recorded(self) -> None:
+        """Test the query keyword argument is fingerprinted."""
+        log_queries(lambda query: None)(query="SELECT * FROM users WHERE id = 7")
+        self.assertEqual(list(query_log.summary()), ["SELECT * FROM users WHERE id = ?"])
+
+    def test_other_strings_are_not_recorded(self) -> None:
+        """Test string values are replaced by the function's name."""
+        @log_queries
+        def find_user(email):
+            return None
+
+        find_user("someone@example.com")
+        find_user("other@example.com")
+        self.assertEqual(list(query_log.summary()),
+                         [find_user.__qualname__])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -13,13 +13,16 @@ if connection:
 
     if connection:
         seed.create_table(connection)
+        seed.migrate_user_data(connection)
+        seed.add_created_at(connection)
         seed.insert_data(connection, 'user_data.csv')
         cursor = connection.cursor()
-        cursor.execute(f"SELECT SCHEMA_NAME FROM INFORMATION_SCHEMA.SCHEMATA WHERE SCHEMA_NAME = 'ALX_prodev';")
-        result = cursor.fetchone()
-        if result:
-            print(f"Database ALX_prodev is present ")
-        cursor.execute(f"SELECT * FROM user_data LIMIT 5;")
+        if seed.db.backend() == 'mysql':
+            cursor.execute(f"SELECT SCHEMA_NAME FROM INFORMATION_SCHEMA.SCHEMATA WHERE SCHEMA_NAME = 'ALX_prodev';")
+            result = cursor.fetchone()
+            if result:
+                print(f"Database ALX_prodev is present ")
+        cursor.execute(f"SELECT {seed.db.USER_COLUMNS} FROM user_data LIMIT 5;")
         rows = cursor.fetchall()
         print(rows)
         cursor.close()
\ No newline at end of file
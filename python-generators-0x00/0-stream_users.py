@@ -1,25 +1,138 @@
-import mysql.connector
+import json
+import os
+import time
 
-def stream_users():
-    """Generator that streams user data from the ALX_prodev database"""
+import db
+
+
+def stream_users(prefetch=1000, row_factory=None):
+    """Generator that streams user data from the ALX_prodev database
+
+    Rows come from an unbuffered cursor, so the server streams the result set
+    and at most `prefetch` rows are held in memory at any time. row_factory
+    (e.g. user_rows.UserRecord.from_row) converts each row before it is yielded.
+    """
+    connection = None
+    cursor = None
     try:
-        connection = mysql.connector.connect(
-            host="localhost",
-            user="your_mysql_user",
-            password="your_mysql_password",
-            database="ALX_prodev"
-        )
-        cursor = connection.cursor()
+        connection = db.connect()
+        cursor = connection.cursor(buffered=False)
 
-        cursor.execute("SELECT user_id, name, email, age FROM user_data")
-        for row in cursor:
-            yield row
+        cursor.execute(f"SELECT {db.USER_COLUMNS} FROM user_data")
+        while True:
+            rows = cursor.fetchmany(prefetch)
+            if not rows:
+                break
+            if row_factory is not None:
+                rows = map(row_factory, rows)
+            for row in rows:
+                yield row
 
-    except mysql.connector.Error as err:
+    except db.Error as err:
         print(f"Database error: {err}")
     finally:
         try:
             cursor.close()
-            connection.close()
         except:
             pass
+        if connection is not None:
+            connection.close()
+
+
+# Rows newer than this are left for the next poll, so a write transaction
+# that commits shortly after taking its created_at is not skipped
+SETTLED_BEFORE_SQL = {
+    'mysql': "NOW(6) - INTERVAL %s MICROSECOND",
+    'sqlite': "strftime('%Y-%m-%d %H:%M:%f', 'now', %s)",
+}
+
+
+def read_watermark(checkpoint_file):
+    """Returns the saved (created_at, user_id key) high-water mark, or None"""
+    try:
+        with open(checkpoint_file, encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        return checkpoint['created_at'], db.uuid_to_bin(checkpoint['user_id'])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def write_watermark(checkpoint_file, watermark):
+    """Atomically records the high-water mark of the last row handed out"""
+    created_at, user_key = watermark
+    tmp_file = checkpoint_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump({'created_at': str(created_at), 'user_id': db.bin_to_uuid(user_key)}, f)
+    os.replace(tmp_file, checkpoint_file)
+
+
+def _fetch_new_users(watermark, batch_size, settle):
+    """Returns up to batch_size rows added after the watermark, oldest first
+
+    Each row ends with its created_at and binary user_id, the watermark parts.
+    """
+    backend = db.backend()
+    clauses = [f"created_at <= {SETTLED_BEFORE_SQL[backend]}"]
+    params = [int(settle * 1e6) if backend == 'mysql' else f"-{settle} seconds"]
+    if watermark is not None:
+        clauses.append("(created_at > %s OR (created_at = %s AND user_data.user_id > %s))")
+        params.extend([watermark[0], watermark[0], watermark[1]])
+    # A fresh connection per poll, so MySQL's snapshot can't hide new rows
+    with db.connect() as connection:
+        cursor = connection.cursor()
+        cursor.execute(
+            f"SELECT {db.USER_COLUMNS}, created_at, user_data.user_id FROM user_data"
+            f" WHERE {' AND '.join(clauses)}"
+            " ORDER BY created_at, user_data.user_id LIMIT %s",
+            params + [batch_size])
+        rows = cursor.fetchall()
+        cursor.close()
+    return rows
+
+
+def tail_users(checkpoint_file=None, follow=True, batch_size=1000, min_interval=0.5,
+               max_interval=30, settle=1.0, row_factory=None):
+    """Generator that yields users added since the last high-water mark
+
+    The mark is the (created_at, user_id) of the last row yielded and is
+    kept in checkpoint_file when one is given, so a rerun carries on where
+    the previous one stopped instead of rescanning user_data. Without a
+    saved mark the whole table is read first. The row being handled when
+    the generator is closed is yielded again on the next run.
+
+    With follow=True the table is polled for new rows forever, waiting
+    min_interval after a poll that found rows and doubling the wait up to
+    max_interval while it finds none; with follow=False the generator
+    stops once it has caught up.
+    Rows are only read once they are settle seconds old, so writes from
+    transactions that stay open longer than that can be missed.
+    """
+    watermark = read_watermark(checkpoint_file) if checkpoint_file else None
+    interval = min_interval
+    try:
+        while True:
+            try:
+                rows = _fetch_new_users(watermark, batch_size, settle)
+            except db.Error as err:
+                print(f"Database error: {err}")
+                return
+            for row in rows:
+                user = row[:-2]
+                yield row_factory(user) if row_factory is not None else user
+                watermark = (row[-2], row[-1])
+            if rows and checkpoint_file:
+                write_watermark(checkpoint_file, watermark)
+
+            if len(rows) == batch_size:
+                # More rows are waiting, read the next page straight away
+                continue
+            if not follow:
+                return
+            if rows:
+                interval = min_interval
+            time.sleep(interval)
+            if not rows:
+                interval = min(interval * 2, max_interval)
+    finally:
+        if checkpoint_file and watermark is not None:
+            write_watermark(checkpoint_file, watermark)
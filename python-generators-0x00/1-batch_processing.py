@@ -1,42 +1,184 @@
-import mysql.connector
+import queue
+import re
+import threading
 
-def stream_users_in_batches(batch_size):
-    """Generator that yields batches of rows from user_data table."""
+import db
+
+COLUMNS = ('user_id', 'name', 'email', 'age')
+
+
+def _like_escape(value):
+    """Escape LIKE wildcards with '!' so the value is matched literally."""
+    return value.replace('!', '!!').replace('%', '!%').replace('_', '!_')
+
+
+# lookup -> function(column, value) returning (sql, params)
+SQL_LOOKUPS = {
+    'eq': lambda col, v: (f"{col} = %s", [v]),
+    'ne': lambda col, v: (f"{col} <> %s", [v]),
+    'gt': lambda col, v: (f"{col} > %s", [v]),
+    'gte': lambda col, v: (f"{col} >= %s", [v]),
+    'lt': lambda col, v: (f"{col} < %s", [v]),
+    'lte': lambda col, v: (f"{col} <= %s", [v]),
+    'in': lambda col, v: (f"{col} IN ({', '.join(['%s'] * len(v))})", list(v)),
+    'startswith': lambda col, v: (f"{col} LIKE %s ESCAPE '!'", [_like_escape(v) + '%']),
+    'endswith': lambda col, v: (f"{col} LIKE %s ESCAPE '!'", ['%' + _like_escape(v)]),
+    'contains': lambda col, v: (f"{col} LIKE %s ESCAPE '!'", ['%' + _like_escape(v) + '%']),
+}
+
+# lookups SQL can't express, applied to each row in Python instead
+PYTHON_LOOKUPS = {
+    'regex': lambda v: re.compile(v).search,
+    'where': lambda v: v,
+}
+
+
+def compile_predicates(**predicates):
+    """Compile Django-style predicates (e.g. age__gt=25) into a WHERE clause.
+
+    Returns (where_sql, params, python_filters) where python_filters is a list
+    of row -> bool functions for lookups that have to run client-side.
+    """
+    clauses = []
+    params = []
+    python_filters = []
+    for key, value in predicates.items():
+        column, _, lookup = key.partition('__')
+        lookup = lookup or 'eq'
+        if column not in COLUMNS:
+            raise ValueError(f"Unknown column: {column}")
+        index = COLUMNS.index(column)
+
+        if lookup in SQL_LOOKUPS:
+            if lookup == 'in' and not value:
+                clauses.append("FALSE")
+                continue
+            # Qualified so the BIN_TO_UUID(...) AS user_id alias never shadows it
+            sql_column = f"user_data.{column}"
+            if column == 'user_id':
+                # user_id is BINARY(16): text lookups match its string form,
+                # comparisons use binary keys
+                if lookup in ('startswith', 'endswith', 'contains'):
+                    sql_column = "BIN_TO_UUID(user_data.user_id, 1)"
+                elif lookup == 'in':
+                    value = [db.uuid_to_bin(v) for v in value]
+                else:
+                    value = db.uuid_to_bin(value)
+            sql, values = SQL_LOOKUPS[lookup](sql_column, value)
+            clauses.append(sql)
+            params.extend(values)
+        elif lookup in PYTHON_LOOKUPS:
+            test = PYTHON_LOOKUPS[lookup](value)
+            python_filters.append(lambda row, test=test, index=index: bool(test(row[index])))
+        else:
+            raise ValueError(f"Unknown lookup: {lookup}")
+
+    where_sql = " WHERE " + " AND ".join(clauses) if clauses else ""
+    return where_sql, params, python_filters
+
+
+def prefetched(batches, depth):
+    """Generator that reads up to `depth` batches ahead in a background thread.
+
+    While the caller processes batch N the thread is already fetching the
+    following ones. Closing this generator stops the thread and closes
+    `batches`, which releases its connection.
+    """
+    handoff = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(message):
+        while not stop.is_set():
+            try:
+                handoff.put(message, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for batch in batches:
+                if not put(('batch', batch)):
+                    return
+            put(('done', None))
+        except BaseException as err:
+            put(('error', err))
+        finally:
+            batches.close()
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            kind, value = handoff.get()
+            if kind == 'done':
+                break
+            if kind == 'error':
+                raise value
+            yield value
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _fetch_batches(batch_size, where_sql, params, python_filters, raise_errors=False):
+    """Generator that runs the user_data query and yields fetchmany batches."""
+    connection = None
+    cursor = None
     try:
-        connection = mysql.connector.connect(
-            host="localhost",
-            user="your_mysql_user",
-            password="your_mysql_password",
-            database="ALX_prodev"
-        )
+        connection = db.connect()
         cursor = connection.cursor()
 
-        cursor.execute("SELECT user_id, name, email, age FROM user_data")
+        cursor.execute(f"SELECT {db.USER_COLUMNS} FROM user_data" + where_sql, params)
 
         while True:
             batch = cursor.fetchmany(batch_size)
             if not batch:
                 break
+            if python_filters:
+                batch = [row for row in batch if all(f(row) for f in python_filters)]
+                if not batch:
+                    continue
             yield batch
 
-    except mysql.connector.Error as err:
+    except db.Error as err:
+        if raise_errors:
+            raise
         print(f"Database error: {err}")
     finally:
         try:
             cursor.close()
-            connection.close()
         except:
             pass
+        if connection is not None:
+            connection.close()
+
+
+def stream_users_in_batches(batch_size, prefetch=0, raise_errors=False, **predicates):
+    """Generator that yields batches of rows from user_data table.
+
+    Predicates such as age__gt=25 or email__endswith='@example.com' are
+    pushed down to SQL; regex/where lookups are applied per row in Python.
+    With prefetch=N a background thread fetches up to N batches ahead.
+    A database error ends the stream after printing it, or is raised with
+    raise_errors=True.
+    """
+    where_sql, params, python_filters = compile_predicates(**predicates)
+    batches = _fetch_batches(batch_size, where_sql, params, python_filters, raise_errors)
+    if prefetch:
+        batches = prefetched(batches, prefetch)
+    try:
+        for batch in batches:
+            yield batch
+    finally:
+        batches.close()
 
 
 
 
 def batch_processing(batch_size):
     """Generator that processes batches and yields users over age 25."""
-    for batch in stream_users_in_batches(batch_size):  # loop 1
-        filtered_batch = (user for user in batch if float(user[3]) > 25)  # generator expression
-        for user in filtered_batch:  # loop 2
+    for batch in stream_users_in_batches(batch_size, age__gt=25):  # loop 1
+        for user in batch:  # loop 2
             yield user  # Yielding each filtered user
-            if not filtered_batch:
-                return
-            print(f"Processed {len(filtered_batch)} users with age > 25 in this batch.")
\ No newline at end of file
@@ -1,37 +1,98 @@
-import mysql.connector
+import db
 
-def paginate_users(page_size, offset):
+def paginate_users(page_size, offset, row_factory=None, raise_errors=False):
     """Fetch a single page of users from user_data at given offset."""
+    connection = None
     try:
-        connection = mysql.connector.connect(
-            host="localhost",
-            user="your_mysql_user",
-            password="your_mysql_password",
-            database="ALX_prodev"
-        )
+        connection = db.connect()
         cursor = connection.cursor()
 
-       # ✅ Now uses SELECT * FROM user_data LIMIT ...
-        cursor.execute("SELECT * FROM user_data LIMIT %s OFFSET %s", (page_size, offset))
+       # ✅ Now uses SELECT ... FROM user_data LIMIT ...
+        cursor.execute(
+            f"SELECT {db.USER_COLUMNS} FROM user_data LIMIT %s OFFSET %s",
+            (page_size, offset)
+        )
         results = cursor.fetchall()
 
         cursor.close()
-        connection.close()
 
+        if row_factory is not None:
+            results = [row_factory(row) for row in results]
         return results
 
-    except mysql.connector.Error as err:
+    except db.Error as err:
+        if raise_errors:
+            raise
         print(f"Database error: {err}")
         return []
+    finally:
+        if connection is not None:
+            connection.close()
+
+
+
+def paginate_users_after(connection, page_size, after=None, row_factory=None):
+    """Fetch the page of users whose user_id follows `after` (keyset pagination)."""
+    cursor = connection.cursor()
+    if after is None:
+        cursor.execute(
+            f"SELECT {db.USER_COLUMNS} FROM user_data ORDER BY user_data.user_id LIMIT %s",
+            (page_size,)
+        )
+    else:
+        cursor.execute(
+            f"SELECT {db.USER_COLUMNS} FROM user_data WHERE user_data.user_id > %s "
+            "ORDER BY user_data.user_id LIMIT %s",
+            (db.uuid_to_bin(after), page_size)
+        )
+    results = cursor.fetchall()
+    cursor.close()
+    if row_factory is not None:
+        results = [row_factory(row) for row in results]
+    return results
+
 
 
+def page_cursor(page):
+    """Return the resume cursor (last user_id) of a page from lazy_paginate."""
+    return page[-1][0] if page else None
 
-def lazy_paginate(page_size):
-    """Generator that yields pages lazily from user_data."""
-    offset = 0
-    while True:  # ✅ Only one loop
-        page = paginate_users(page_size, offset)
-        if not page:
-            break
-        yield page  # ✅ Use of yield
-        offset += page_size
+
+
+def lazy_paginate(page_size, keyset=False, after=None, row_factory=None, raise_errors=False):
+    """Generator that yields pages lazily from user_data.
+
+    With keyset=True pages are read with `WHERE user_id > last_seen` over a
+    single held connection, so each page costs the same however deep it is.
+    Pass `after=page_cursor(page)` to resume after a previously seen page.
+    row_factory (e.g. user_rows.UserRecord.from_row) converts each row.
+    A database error ends the pages after printing it, or is raised with
+    raise_errors=True.
+    """
+    if not keyset:
+        offset = 0
+        while True:  # ✅ Only one loop
+            page = paginate_users(page_size, offset, row_factory, raise_errors)
+            if not page:
+                break
+            yield page  # ✅ Use of yield
+            offset += page_size
+        return
+
+    connection = None
+    try:
+        connection = db.connect()
+        while True:
+            page = paginate_users_after(connection, page_size, after, row_factory)
+            if not page:
+                break
+            yield page
+            after = page_cursor(page)
+
+    except db.Error as err:
+        if raise_errors:
+            raise
+        print(f"Database error: {err}")
+    finally:
+        if connection is not None:
+            connection.close()
@@ -1,35 +1,213 @@
-import mysql.connector
+import math
+import random
+from array import array
+
+import db
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+NUMERIC_COLUMNS = ('age',)
+STATS = ('count', 'sum', 'mean', 'min', 'max', 'stddev')
+
+
+def connect_to_prodev():
+    """Checks out a pooled connection to the ALX_prodev database."""
+    return db.connect()
+
 
 def stream_user_ages():
     """Generator that yields user ages one by one from user_data table."""
+    connection = None
+    cursor = None
     try:
-        connection = mysql.connector.connect(
-            host="localhost",
-            user="your_mysql_user",
-            password="your_mysql_password",
-            database="ALX_prodev"
-        )
+        connection = connect_to_prodev()
         cursor = connection.cursor()
 
         cursor.execute("SELECT age FROM user_data")
         for (age,) in cursor:  # ✅ loop 1
             yield float(age)
 
+    except db.Error as err:
+        print(f"Database error: {err}")
+    finally:
+        # Runs on an early close() of the generator too, so the pooled
+        # connection always goes back
+        try:
+            cursor.close()
+        except:
+            pass
+        if connection is not None:
+            connection.close()
+
+
+def stream_column_blocks(connection, column, block_size):
+    """Generator that yields fetchmany blocks of a numeric column as floats."""
+    cursor = connection.cursor()
+    try:
+        # Casting server-side avoids building a Decimal per row
+        cursor.execute(f"SELECT CAST({column} AS DOUBLE) FROM user_data")
+        while True:
+            rows = cursor.fetchmany(block_size)
+            if not rows:
+                break
+            yield [value for (value,) in rows]
+    finally:
         cursor.close()
-        connection.close()
 
-    except mysql.connector.Error as err:
-        print(f"Database error: {err}")
 
+def _percentile(sorted_values, q):
+    """Linear-interpolated percentile of an already sorted sequence."""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q / 100
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    return (sorted_values[lower]
+            + (sorted_values[upper] - sorted_values[lower]) * (position - lower))
+
+
+def _aggregate_sql(connection, column, percentiles):
+    """Computes the statistics with SQL aggregates on the server."""
+    cursor = connection.cursor()
+    cursor.execute(f"""
+        SELECT COUNT({column}), SUM({column}), AVG({column}),
+               MIN({column}), MAX({column}), STDDEV_POP({column})
+        FROM user_data
+    """)
+    row = cursor.fetchone()
+    result = {name: (float(value) if value is not None else None)
+              for name, value in zip(STATS, row)}
+    result['count'] = int(row[0])
+
+    # MySQL has no PERCENTILE_CONT, so read the two neighbouring ranks
+    for q in percentiles:
+        result[f"p{q:g}"] = None
+        if not result['count']:
+            continue
+        position = (result['count'] - 1) * q / 100
+        cursor.execute(
+            f"SELECT {column} FROM user_data ORDER BY {column} LIMIT %s OFFSET %s",
+            (2, math.floor(position))
+        )
+        values = [float(value) for (value,) in cursor.fetchall()]
+        result[f"p{q:g}"] = _percentile(values, (position - math.floor(position)) * 100)
+    cursor.close()
+    return result
 
 
+def _aggregate_vectorized(blocks, percentiles):
+    """Computes the statistics by reducing fetchmany blocks as whole arrays."""
+    if numpy is not None:
+        chunks = [numpy.asarray(block, dtype=numpy.float64) for block in blocks]
+        values = numpy.concatenate(chunks) if chunks else numpy.empty(0)
+        count = int(values.size)
+        result = {'count': count}
+        if count:
+            result.update(sum=float(values.sum()), mean=float(values.mean()),
+                          min=float(values.min()), max=float(values.max()),
+                          stddev=float(values.std()))
+            for q in percentiles:
+                result[f"p{q:g}"] = float(numpy.percentile(values, q))
+    else:
+        values = array('d')
+        for block in blocks:
+            values.extend(block)
+        count = len(values)
+        result = {'count': count}
+        if count:
+            total = math.fsum(values)
+            mean = total / count
+            result.update(sum=total, mean=mean, min=min(values), max=max(values),
+                          stddev=math.sqrt(math.fsum((v - mean) ** 2 for v in values) / count))
+            ordered = sorted(values)
+            for q in percentiles:
+                result[f"p{q:g}"] = _percentile(ordered, q)
 
-def compute_average_age():
-    """Computes average age using the generator without loading all data into memory."""
-    total = 0
+    for name in STATS:
+        result.setdefault(name, None)
+    for q in percentiles:
+        result.setdefault(f"p{q:g}", None)
+    return result
+
+
+def _aggregate_streaming(blocks, percentiles, sample_size):
+    """Computes the statistics in constant memory.
+
+    Mean and stddev use Welford's online algorithm; percentiles are
+    approximated from a fixed-size reservoir sample.
+    """
     count = 0
-    for age in stream_user_ages():  # ✅ loop 2
-        total += age
-        count += 1
-    average = total / count if count > 0 else 0
+    total = 0.0
+    mean = 0.0
+    m2 = 0.0
+    low = high = None
+    sample = []
+    for block in blocks:
+        for value in block:
+            count += 1
+            total += value
+            delta = value - mean
+            mean += delta / count
+            m2 += delta * (value - mean)
+            if low is None or value < low:
+                low = value
+            if high is None or value > high:
+                high = value
+            if len(sample) < sample_size:
+                sample.append(value)
+            else:
+                slot = random.randrange(count)
+                if slot < sample_size:
+                    sample[slot] = value
+
+    result = dict.fromkeys(STATS)
+    result['count'] = count
+    if count:
+        result.update(sum=total, mean=mean, min=low, max=high,
+                      stddev=math.sqrt(m2 / count))
+    sample.sort()
+    for q in percentiles:
+        result[f"p{q:g}"] = _percentile(sample, q)
+    return result
+
+
+def aggregate(column='age', percentiles=(), strategy='sql', block_size=10000,
+              sample_size=10000):
+    """Computes count/sum/mean/min/max/stddev and percentiles of a column.
+
+    strategy is 'sql' (server-side aggregates), 'vectorized' (fetchmany
+    blocks reduced with NumPy, or array('d') without it) or 'streaming'
+    (constant memory, approximate percentiles). Returns a dict keyed by
+    statistic name, with percentiles as 'p50', 'p99', ...
+    """
+    if column not in NUMERIC_COLUMNS:
+        raise ValueError(f"Unknown numeric column: {column}")
+    if strategy not in ('sql', 'vectorized', 'streaming'):
+        raise ValueError(f"Unknown strategy: {strategy}")
+
+    try:
+        connection = connect_to_prodev()
+        try:
+            if strategy == 'sql':
+                return _aggregate_sql(connection, column, percentiles)
+            blocks = stream_column_blocks(connection, column, block_size)
+            if strategy == 'vectorized':
+                return _aggregate_vectorized(blocks, percentiles)
+            return _aggregate_streaming(blocks, percentiles, sample_size)
+        finally:
+            connection.close()
+
+    except db.Error as err:
+        print(f"Database error: {err}")
+        return {}
+
+
+
+
+def compute_average_age(strategy='streaming'):
+    """Computes average age without loading all data into memory."""
+    average = aggregate('age', strategy=strategy).get('mean') or 0
     print(f"Average age of users: {average:.2f}")
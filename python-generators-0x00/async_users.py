@@ -0,0 +1,104 @@
+import asyncio
+import threading
+
+import db
+
+stream_users_in_batches = __import__('1-batch_processing').stream_users_in_batches
+lazy_paginate = __import__('2-lazy_paginate').lazy_paginate
+stream_column_blocks = __import__('4-stream_ages').stream_column_blocks
+
+_ITEM, _DONE, _ERROR = range(3)
+
+
+async def athread_iter(make_generator, max_ahead=2):
+    """Async generator that runs a blocking generator in a worker thread
+
+    The thread hands items over through a queue of size max_ahead, so it
+    blocks (backpressure) once it is max_ahead items ahead of the consumer.
+    Closing the async generator early stops the thread and closes the
+    blocking generator, releasing its connection. Each stream gets its own
+    daemon thread rather than a slot in the loop's default executor, which
+    long-lived producers would otherwise fill up and starve.
+
+    The streams below each hold one pooled connection while open, so at
+    most pool_size of them (MYSQL_POOL_SIZE, default 5) can run at once.
+    Another one waits checkout_timeout seconds for a free connection and
+    then raises db.PoolError to its consumer; size the pool for the number
+    of concurrent streams.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=max_ahead)
+    stop = threading.Event()
+
+    def put(message):
+        asyncio.run_coroutine_threadsafe(queue.put(message), loop).result()
+
+    def produce():
+        generator = make_generator()
+        try:
+            for item in generator:
+                if stop.is_set():
+                    return
+                put((_ITEM, item))
+            if not stop.is_set():
+                put((_DONE, None))
+        except BaseException as err:
+            if not stop.is_set():
+                put((_ERROR, err))
+        finally:
+            generator.close()
+
+    producer = threading.Thread(target=produce, name='athread_iter', daemon=True)
+    producer.start()
+    try:
+        while True:
+            kind, value = await queue.get()
+            if kind == _DONE:
+                break
+            if kind == _ERROR:
+                raise value
+            yield value
+    finally:
+        stop.set()
+        # Free any put the producer is blocked on so it can see the stop flag
+        while producer.is_alive():
+            while not queue.empty():
+                queue.get_nowait()
+            await asyncio.sleep(0.001)
+
+
+async def astream_users_in_batches(batch_size, max_ahead=2, **predicates):
+    """Async counterpart of stream_users_in_batches"""
+    async for batch in athread_iter(
+            lambda: stream_users_in_batches(batch_size, raise_errors=True, **predicates),
+            max_ahead):
+        yield batch
+
+
+async def astream_users(prefetch=1000, max_ahead=2):
+    """Async counterpart of stream_users; rows cross threads a block at a time"""
+    async for batch in astream_users_in_batches(prefetch, max_ahead):
+        for row in batch:
+            yield row
+
+
+async def alazy_paginate(page_size, keyset=False, after=None, max_ahead=2):
+    """Async counterpart of lazy_paginate"""
+    async for page in athread_iter(
+            lambda: lazy_paginate(page_size, keyset=keyset, after=after, raise_errors=True),
+            max_ahead):
+        yield page
+
+
+def _user_age_blocks(block_size):
+    """Generator that yields blocks of ages on a pooled connection"""
+    with db.connect() as connection:
+        for block in stream_column_blocks(connection, 'age', block_size):
+            yield block
+
+
+async def astream_user_ages(block_size=1000, max_ahead=2):
+    """Async counterpart of stream_user_ages"""
+    async for block in athread_iter(lambda: _user_age_blocks(block_size), max_ahead):
+        for age in block:
+            yield age
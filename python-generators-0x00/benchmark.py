@@ -0,0 +1,449 @@
+#!/usr/bin/python3
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+import tracemalloc
+import uuid
+from decimal import Decimal
+
+db = __import__('db')
+seed = __import__('seed')
+stream_users = __import__('0-stream_users').stream_users
+batch_processing = __import__('1-batch_processing')
+lazy_paginate = __import__('2-lazy_paginate')
+stream_ages = __import__('4-stream_ages')
+partitioned_scan = __import__('partitioned_scan')
+user_rows = __import__('user_rows')
+
+
+# The benchmarks empty and drop user_data, so main() points them here
+BENCH_DATABASE = 'ALX_prodev_bench'
+
+
+def use_benchmark_database(name=BENCH_DATABASE):
+    """Points the configured backend at a scratch database, creating it on MySQL
+
+    Call it before any connection is made; spawned workers inherit it
+    through the environment. On SQLite the database is the file NAME.sqlite3.
+    """
+    if db.backend() == 'sqlite':
+        os.environ['PRODEV_SQLITE_PATH'] = f"{name}.sqlite3"
+        return
+    os.environ['MYSQL_DATABASE'] = name
+    connection = seed.connect_db()
+    if not connection:
+        return
+    cursor = connection.cursor()
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{name.replace('`', '``')}`")
+    cursor.close()
+    connection.close()
+
+
+def generate_csv(csv_file, rows):
+    """Writes a synthetic user_data CSV file with the given number of rows"""
+    with open(csv_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+        writer.writerow(['name', 'email', 'age'])
+        for i in range(rows):
+            writer.writerow([f"User {i}", f"user{i}@example.com",
+                             random.randint(18, 120)])
+
+
+def truncate_user_data(connection):
+    """Empties the user_data table between benchmark runs"""
+    cursor = connection.cursor()
+    if db.backend() == 'mysql':
+        cursor.execute("TRUNCATE TABLE user_data")
+    else:
+        cursor.execute("DELETE FROM user_data")
+    connection.commit()
+    cursor.close()
+
+
+def bench_seed(rows=1_000_000, csv_file='bench_user_data.csv'):
+    """Compares the per-row insert path against the bulk loader"""
+    generate_csv(csv_file, rows)
+    connection = seed.connect_to_prodev()
+    if not connection:
+        return {}
+    seed.create_table(connection)
+
+    results = {}
+    runs = [
+        ('per_row', lambda: seed.insert_data_per_row(connection, csv_file)),
+        ('executemany', lambda: seed.insert_data_bulk(
+            connection, csv_file, use_load_data=False)),
+        ('load_data', lambda: seed.insert_data_bulk(connection, csv_file)),
+    ]
+    for name, run in runs:
+        truncate_user_data(connection)
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        results[name] = {'seconds': elapsed, 'rows_per_sec': rows / elapsed}
+        print(f"{name}: {elapsed:.2f}s ({rows / elapsed:,.0f} rows/sec)")
+
+    connection.close()
+    return results
+
+
+def seed_rows(connection, rows, csv_file='bench_user_data.csv'):
+    """Reloads user_data with a synthetic dataset of the given size"""
+    generate_csv(csv_file, rows)
+    truncate_user_data(connection)
+    seed.insert_data_bulk(connection, csv_file)
+
+
+def bench_stream_memory(sizes=(10_000, 1_000_000, 10_000_000), prefetch=1000):
+    """Measures the tracemalloc peak of a full stream_users pass per table size"""
+    connection = seed.connect_to_prodev()
+    if not connection:
+        return {}
+    seed.create_table(connection)
+
+    results = {}
+    for rows in sizes:
+        seed_rows(connection, rows)
+        tracemalloc.start()
+        count = 0
+        for _ in stream_users(prefetch=prefetch):
+            count += 1
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[rows] = {'rows': count, 'peak_bytes': peak}
+        print(f"{rows:>10} rows: peak {peak / 1024:,.1f} KiB")
+
+    connection.close()
+    return results
+
+
+def bench_paginate_latency(rows=1_000_000, page_size=100,
+                           page_indexes=(0, 10, 100, 1000, 9000), repeat=5):
+    """Compares per-page latency of OFFSET and keyset pagination by page depth"""
+    connection = seed.connect_to_prodev()
+    if not connection:
+        return {}
+    seed.create_table(connection)
+    seed_rows(connection, rows)
+
+    results = {}
+    cursor = connection.cursor()
+    for index in page_indexes:
+        after = None
+        if index:
+            cursor.execute(
+                "SELECT BIN_TO_UUID(user_id, 1) FROM user_data ORDER BY user_id "
+                "LIMIT 1 OFFSET %s",
+                (index * page_size - 1,)
+            )
+            after = cursor.fetchone()[0]
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            lazy_paginate.paginate_users(page_size, index * page_size)
+        offset_ms = (time.perf_counter() - start) / repeat * 1000
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            lazy_paginate.paginate_users_after(connection, page_size, after)
+        keyset_ms = (time.perf_counter() - start) / repeat * 1000
+
+        results[index] = {'offset_ms': offset_ms, 'keyset_ms': keyset_ms}
+        print(f"page {index:>6}: offset {offset_ms:.2f} ms, keyset {keyset_ms:.2f} ms")
+
+    cursor.close()
+    connection.close()
+    return results
+
+
+def bench_aggregate(rows=10_000_000, percentiles=(50, 90, 99)):
+    """Compares the sql, vectorized and streaming aggregation strategies"""
+    connection = seed.connect_to_prodev()
+    if not connection:
+        return {}
+    seed.create_table(connection)
+    seed_rows(connection, rows)
+    connection.close()
+
+    results = {}
+    for strategy in ('sql', 'vectorized', 'streaming'):
+        tracemalloc.start()
+        start = time.perf_counter()
+        stats = stream_ages.aggregate('age', percentiles=percentiles, strategy=strategy)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[strategy] = {'seconds': elapsed, 'peak_bytes': peak, 'stats': stats}
+        print(f"{strategy}: {elapsed:.2f}s, peak {peak / 1024:,.1f} KiB, "
+              f"mean {stats.get('mean')}, p50 {stats.get('p50')}")
+    return results
+
+
+def bench_partitioned_scan(rows=1_000_000, worker_counts=(1, 2, 4, 8)):
+    """Measures partitioned scan throughput as the number of workers grows"""
+    connection = seed.connect_to_prodev()
+    if not connection:
+        return {}
+    seed.create_table(connection)
+    seed_rows(connection, rows)
+    connection.close()
+
+    results = {}
+    for workers in worker_counts:
+        start = time.perf_counter()
+        count = sum(1 for _ in partitioned_scan.partitioned_scan(workers=workers))
+        elapsed = time.perf_counter() - start
+        results[workers] = {'rows': count, 'rows_per_sec': count / elapsed}
+        print(f"{workers} workers: {count / elapsed:,.0f} rows/sec")
+    return results
+
+
+def synthetic_rows(rows):
+    """Generator of rows shaped like the driver's (str UUID, str, str, Decimal)"""
+    first_names = ['Ada', 'Grace', 'Alan', 'Linus', 'Barbara', 'Dennis']
+    for i in range(rows):
+        name = f"{random.choice(first_names)} User"
+        yield (str(uuid.uuid4()), name, f"user{i}@example.com",
+               Decimal(random.randint(18, 120)))
+
+
+def bench_row_memory(rows=1_000_000):
+    """Compares the memory held by tuples, UserRecord lists and a UserBatch"""
+    layouts = [
+        ('tuples', list),
+        ('records', lambda source: [user_rows.UserRecord.from_row(row) for row in source]),
+        ('batch', user_rows.UserBatch.from_rows),
+    ]
+    results = {}
+    for name, build in layouts:
+        random.seed(0)
+        tracemalloc.start()
+        held = build(synthetic_rows(rows))
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del held
+        results[name] = {'bytes': current, 'bytes_per_row': current / rows}
+        print(f"{name}: {current / 2 ** 20:,.1f} MiB ({current / rows:.0f} bytes/row)")
+    return results
+
+
+LEGACY_USER_DATA_DDL = """
+    CREATE TABLE user_data (
+        user_id CHAR(36) PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        email VARCHAR(255) NOT NULL,
+        age DECIMAL NOT NULL,
+        INDEX(user_id)
+    )
+"""
+
+
+def time_generator_queries(connection, columns, key):
+    """Times the queries the generators issue against the current schema"""
+    queries = [
+        ('stream_users', f"SELECT {columns} FROM user_data", ()),
+        ('batch_processing', f"SELECT {columns} FROM user_data WHERE age > %s", (25,)),
+        ('email_lookup', f"SELECT {columns} FROM user_data WHERE email = %s",
+         ('user500000@example.com',)),
+        ('keyset_page', f"SELECT {columns} FROM user_data WHERE user_data.user_id > %s "
+                        "ORDER BY user_data.user_id LIMIT 100", (key,)),
+        ('average_age', "SELECT AVG(age) FROM user_data", ()),
+    ]
+    timings = {}
+    cursor = connection.cursor()
+    for name, sql, params in queries:
+        start = time.perf_counter()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        timings[name] = time.perf_counter() - start
+    cursor.close()
+    return timings
+
+
+def bench_schema_migration(rows=1_000_000, batch_size=10000):
+    """Times the generators' queries before and after migrate_user_data (MySQL only)"""
+    if db.backend() != 'mysql':
+        print("bench_schema_migration needs the mysql backend.")
+        return {}
+    connection = seed.connect_to_prodev()
+    if not connection:
+        return {}
+    cursor = connection.cursor()
+    cursor.execute("DROP TABLE IF EXISTS user_data")
+    cursor.execute(LEGACY_USER_DATA_DDL)
+    batch = []
+    for row in synthetic_rows(rows):
+        batch.append(row)
+        if len(batch) == batch_size:
+            cursor.executemany(
+                "INSERT INTO user_data (user_id, name, email, age) VALUES (%s, %s, %s, %s)",
+                batch)
+            connection.commit()
+            batch = []
+    if batch:
+        cursor.executemany(
+            "INSERT INTO user_data (user_id, name, email, age) VALUES (%s, %s, %s, %s)",
+            batch)
+        connection.commit()
+    cursor.execute("SELECT user_id FROM user_data ORDER BY user_id LIMIT 1 OFFSET %s",
+                   (rows // 2,))
+    middle_key = cursor.fetchone()[0]
+    cursor.close()
+
+    before = time_generator_queries(connection, "user_id, name, email, age", middle_key)
+    seed.migrate_user_data(connection)
+    after = time_generator_queries(connection, db.USER_COLUMNS, db.uuid_to_bin(middle_key))
+    connection.close()
+
+    for name in before:
+        print(f"{name}: {before[name] * 1000:.1f} ms -> {after[name] * 1000:.1f} ms")
+    return {'before': before, 'after': after}
+
+
+def _flatten(batches):
+    for batch in batches:
+        for row in batch:
+            yield row
+
+
+def _average_age(size):
+    """Runs compute_average_age's aggregation, counting each reduced age as a row"""
+    result = stream_ages.aggregate('age', strategy='streaming', block_size=size)
+    return iter(range(result.get('count') or 0))
+
+
+# Generator cases for the suite; each takes the batch/page size under test
+SUITE_CASES = {
+    'stream_users': lambda size: stream_users(prefetch=size),
+    'stream_users_in_batches': lambda size: _flatten(
+        batch_processing.stream_users_in_batches(size)),
+    'stream_users_in_batches_prefetch': lambda size: _flatten(
+        batch_processing.stream_users_in_batches(size, prefetch=2)),
+    'batch_processing': lambda size: batch_processing.batch_processing(size),
+    'lazy_paginate': lambda size: _flatten(lazy_paginate.lazy_paginate(size)),
+    'lazy_paginate_keyset': lambda size: _flatten(
+        lazy_paginate.lazy_paginate(size, keyset=True)),
+    'stream_user_ages': lambda size: stream_ages.stream_user_ages(),
+    'compute_average_age': lambda size: _average_age(size),
+}
+
+
+def peak_rss_bytes():
+    """Returns this process's peak resident set size in bytes"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_case(name, size):
+    """Runs one generator case to completion and returns its measurements"""
+    round_trips = db.get_pool().metrics['round_trips']
+    rows = 0
+    first_row = None
+    start = time.perf_counter()
+    for _ in SUITE_CASES[name](size):
+        if first_row is None:
+            first_row = time.perf_counter() - start
+        rows += 1
+    elapsed = time.perf_counter() - start
+    return {
+        'case': name,
+        'size': size,
+        'rows': rows,
+        'seconds': elapsed,
+        'rows_per_sec': rows / elapsed if elapsed else None,
+        'time_to_first_row': first_row,
+        'peak_rss_bytes': peak_rss_bytes(),
+        'round_trips': db.get_pool().metrics['round_trips'] - round_trips,
+    }
+
+
+def run_suite(rows=100_000, sizes=(100, 1000, 10000), cases=None):
+    """Seeds a synthetic dataset and runs every generator case at every size
+
+    Each case runs in a fresh spawned process so peak RSS is measured
+    per case rather than for the whole suite.
+    """
+    connection = seed.connect_to_prodev()
+    if not connection:
+        return {}
+    seed.create_table(connection)
+    seed_rows(connection, rows)
+    connection.close()
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for name in cases or SUITE_CASES:
+        for size in sizes:
+            with context.Pool(1) as pool:
+                result = pool.apply(run_case, (name, size))
+            results.append(result)
+            print(f"{name} size={size}: {result['rows_per_sec'] or 0:,.0f} rows/sec, "
+                  f"first row {result['time_to_first_row'] or 0:.4f}s, "
+                  f"{result['round_trips']} round trips", file=sys.stderr)
+    return {
+        'backend': db.backend(),
+        'rows': rows,
+        'python': sys.version.split()[0],
+        'results': results,
+    }
+
+
+BENCHMARKS = {
+    'seed': bench_seed,
+    'stream_memory': bench_stream_memory,
+    'paginate_latency': bench_paginate_latency,
+    'aggregate': bench_aggregate,
+    'partitioned_scan': bench_partitioned_scan,
+    'row_memory': bench_row_memory,
+    'schema_migration': bench_schema_migration,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks for python-generators-0x00")
+    parser.add_argument('benchmark', nargs='?', default='suite',
+                        choices=['suite'] + list(BENCHMARKS))
+    parser.add_argument('--backend', choices=['mysql', 'sqlite'],
+                        help="overrides PRODEV_BACKEND")
+    parser.add_argument('--rows', type=int, default=100_000,
+                        help="synthetic dataset size for the suite")
+    parser.add_argument('--sizes', default='100,1000,10000',
+                        help="comma-separated batch/page sizes for the suite")
+    parser.add_argument('--cases', help="comma-separated suite cases (default: all)")
+    parser.add_argument('--database', default=BENCH_DATABASE,
+                        help="scratch database whose user_data the benchmarks overwrite "
+                             f"(default {BENCH_DATABASE}; NAME.sqlite3 on SQLite)")
+    parser.add_argument('--output', help="write JSON results to this file")
+    args = parser.parse_args(argv)
+
+    if args.backend:
+        # Set before any connection is made; spawned workers inherit it
+        os.environ['PRODEV_BACKEND'] = args.backend
+    use_benchmark_database(args.database)
+
+    if args.benchmark == 'suite':
+        results = run_suite(
+            rows=args.rows,
+            sizes=[int(size) for size in args.sizes.split(',')],
+            cases=args.cases.split(',') if args.cases else None
+        )
+    else:
+        results = BENCHMARKS[args.benchmark]()
+
+    report = json.dumps(results, indent=2, default=str)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
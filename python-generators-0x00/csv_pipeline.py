@@ -0,0 +1,127 @@
+import csv
+import mmap
+import multiprocessing
+import os
+import re
+from decimal import Decimal, InvalidOperation
+
+EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+MIN_AGE = 0
+MAX_AGE = 150
+
+
+def read_header(csv_file):
+    """Returns the parsed header row and the byte offset where data starts"""
+    with open(csv_file, 'rb') as f:
+        line = f.readline()
+        return next(csv.reader([line.decode('utf-8')]), []), f.tell()
+
+
+def split_chunks(csv_file, chunk_bytes, start=0):
+    """Returns (start, end) byte ranges of roughly chunk_bytes, cut at line ends"""
+    size = os.path.getsize(csv_file)
+    if size <= start:
+        return []
+    chunks = []
+    with open(csv_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        while start < size:
+            end = data.find(b'\n', min(start + chunk_bytes, size - 1))
+            end = size if end == -1 else end + 1
+            chunks.append((start, end))
+            start = end
+    return chunks
+
+
+def validate_row(name, email, age):
+    """Returns (clean_row, None) for a valid row or (None, reason) otherwise"""
+    name = name.strip()
+    email = email.strip()
+    if not name:
+        return None, 'missing name'
+    if not EMAIL_RE.match(email):
+        return None, 'invalid email'
+    try:
+        age = Decimal(age.strip())
+    except InvalidOperation:
+        return None, 'invalid age'
+    if not age.is_finite():
+        return None, 'invalid age'
+    if not MIN_AGE <= age <= MAX_AGE:
+        return None, 'age out of range'
+    age = int(age) if age == age.to_integral_value() else float(age)
+    return (name, email, age), None
+
+
+def parse_chunk(task):
+    """Parses and validates one byte range of the CSV (runs in a worker process)
+
+    Returns (clean_rows, rejected) where rejected holds (line, reason) pairs.
+    """
+    csv_file, start, end, columns = task
+    name_col, email_col, age_col = columns
+    clean = []
+    rejected = []
+    with open(csv_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        lines = data[start:end].decode('utf-8').splitlines()
+    for line in lines:
+        if not line.strip():
+            continue
+        fields = next(csv.reader([line]))
+        if len(fields) <= max(columns):
+            rejected.append((line, 'missing fields'))
+            continue
+        row, reason = validate_row(fields[name_col], fields[email_col], fields[age_col])
+        if reason:
+            rejected.append((line, reason))
+        else:
+            clean.append(row)
+    return clean, rejected
+
+
+def validated_batches(csv_file, batch_size=1000, workers=None, chunk_bytes=4 * 2 ** 20,
+                      rejects_file=None):
+    """Generator that yields batches of clean (name, email, age) rows in file order
+
+    The file is cut into chunks at line boundaries, which a process pool
+    parses and validates through memory-mapped reads. Rows whose email was
+    already seen are rejected as duplicates. Rejected rows go to a sidecar
+    CSV (default <csv_file>.rejected.csv) with the reason appended. Quoted
+    fields must not contain newlines. A file without a name, email and age
+    header yields nothing.
+    """
+    header, data_start = read_header(csv_file)
+    if not {'name', 'email', 'age'}.issubset(header):
+        # Empty or header-less file: there is nothing to validate
+        return
+    columns = (header.index('name'), header.index('email'), header.index('age'))
+    tasks = [(csv_file, start, end, columns)
+             for start, end in split_chunks(csv_file, chunk_bytes, data_start)]
+
+    seen_emails = set()
+    batch = []
+    with open(rejects_file or csv_file + '.rejected.csv', 'w', newline='',
+              encoding='utf-8') as rejects, multiprocessing.Pool(workers) as pool:
+        writer = csv.writer(rejects)
+        writer.writerow(header + ['reason'])
+        # imap keeps chunk order, so batches follow the file
+        for clean, rejected in pool.imap(parse_chunk, tasks):
+            for line, reason in rejected:
+                fields = next(csv.reader([line]))
+                # Short rows are padded so the reason stays in its own column
+                fields += [''] * (len(header) - len(fields))
+                writer.writerow(fields + [reason])
+            for row in clean:
+                key = row[1].lower()
+                if key in seen_emails:
+                    fields = [''] * len(header)
+                    for index, value in zip(columns, row):
+                        fields[index] = str(value)
+                    writer.writerow(fields + ['duplicate email'])
+                    continue
+                seen_emails.add(key)
+                batch.append(row)
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,425 @@
+import configparser
+import functools
+import math
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+try:
+    import mysql.connector
+except ImportError:
+    mysql = None
+
+
+class PoolError(Exception):
+    """Raised when no pooled connection becomes free in time"""
+
+
+# Every backend's errors, for `except db.Error`
+Error = (PoolError, sqlite3.Error) + ((mysql.connector.Error,) if mysql else ())
+
+DEFAULT_CONFIG = {
+    'backend': 'mysql',
+    'sqlite_path': 'ALX_prodev.sqlite3',
+    'host': 'localhost',
+    'port': '3306',
+    'user': 'your_mysql_user',
+    'password': 'your_mysql_password',
+    'database': 'ALX_prodev',
+    'pool_size': '5',
+    'max_lifetime': '3600',
+    'checkout_timeout': '30',
+}
+
+# user_id is stored as BINARY(16) in MySQL's UUID_TO_BIN(uuid, 1) layout.
+# That swap only orders time-based UUIDs; keys here are email-derived
+# UUIDv5 hashes, so rows land in random key order. Hashed keys make reloads
+# idempotent upserts at the cost of scattered primary-key inserts; the
+# layout is kept so existing keys stay valid. created_at gives time order.
+# Queries that filter or sort on the key must say user_data.user_id, as a
+# bare user_id in ORDER BY resolves to the string alias below
+USER_COLUMNS = "BIN_TO_UUID(user_id, 1) AS user_id, name, email, age"
+
+
+def uuid_to_bin(value):
+    """Returns the BINARY(16) form of a UUID, matching UUID_TO_BIN(value, 1)"""
+    raw = uuid.UUID(str(value)).bytes
+    return raw[6:8] + raw[4:6] + raw[0:4] + raw[8:]
+
+
+def bin_to_uuid(raw):
+    """Returns the UUID string for a BINARY(16) key, matching BIN_TO_UUID(raw, 1)"""
+    raw = bytes(raw)
+    return str(uuid.UUID(bytes=raw[4:8] + raw[2:4] + raw[0:2] + raw[8:]))
+
+
+def _env_name(key):
+    if key in ('backend', 'sqlite_path'):
+        return f"PRODEV_{key.upper()}"
+    return f"MYSQL_{key.upper()}"
+
+
+def load_config(path=None):
+    """Returns connection settings from defaults, a config file and the environment
+
+    The config file is an INI file with [prodev] (backend, sqlite_path) and
+    [mysql] sections, read from `path` or $PRODEV_DB_CONFIG. Environment
+    variables such as PRODEV_BACKEND, MYSQL_HOST or MYSQL_POOL_SIZE
+    override both.
+    """
+    config = dict(DEFAULT_CONFIG)
+    path = path or os.environ.get('PRODEV_DB_CONFIG')
+    if path:
+        parser = configparser.ConfigParser()
+        parser.read(path)
+        for section in ('prodev', 'mysql'):
+            if parser.has_section(section):
+                config.update(parser.items(section))
+    for key in config:
+        env_value = os.environ.get(_env_name(key))
+        if env_value is not None:
+            config[key] = env_value
+    if config['backend'] not in ('mysql', 'sqlite'):
+        raise ValueError(f"Unknown database backend: {config['backend']}")
+    return config
+
+
+def backend():
+    """Returns the configured backend name, 'mysql' or 'sqlite'"""
+    return load_config()['backend']
+
+
+def target():
+    """Returns a string naming the configured database, e.g. 'sqlite:/data/ALX_prodev.sqlite3'"""
+    config = load_config()
+    if config['backend'] == 'sqlite':
+        return f"sqlite:{os.path.abspath(config['sqlite_path'])}"
+    return f"mysql://{config['host']}:{config['port']}/{config['database']}"
+
+
+class _StddevPop:
+    """SQLite aggregate matching MySQL's STDDEV_POP (Welford's algorithm)"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def step(self, value):
+        if value is None:
+            return
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def finalize(self):
+        return math.sqrt(self.m2 / self.count) if self.count else None
+
+
+def _sqlite_uuid_to_bin(value, swap=1):
+    if value is None:
+        return None
+    return uuid_to_bin(value) if swap else uuid.UUID(str(value)).bytes
+
+
+def _sqlite_bin_to_uuid(raw, swap=1):
+    if raw is None:
+        return None
+    return bin_to_uuid(raw) if swap else str(uuid.UUID(bytes=bytes(raw)))
+
+
+class SQLiteCursor:
+    """sqlite3 cursor that accepts the %s placeholders used throughout"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(sql.replace('%s', '?'), tuple(params))
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._cursor.executemany(sql.replace('%s', '?'), seq_of_params)
+        return self
+
+
+class SQLiteConnection:
+    """sqlite3 connection exposing the parts of the mysql-connector API we use
+
+    Opened in WAL mode with tuned pragmas, and with the MySQL functions
+    the queries rely on (UUID_TO_BIN, BIN_TO_UUID, RAND, STDDEV_POP)
+    registered as SQLite functions.
+    """
+
+    PRAGMAS = (
+        "PRAGMA journal_mode = WAL",
+        "PRAGMA synchronous = NORMAL",
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA cache_size = -65536",
+        "PRAGMA mmap_size = 268435456",
+        "PRAGMA busy_timeout = 5000",
+    )
+
+    unread_result = False
+
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        for pragma in self.PRAGMAS:
+            self._connection.execute(pragma)
+        self._connection.create_function('UUID_TO_BIN', 1, _sqlite_uuid_to_bin, deterministic=True)
+        self._connection.create_function('UUID_TO_BIN', 2, _sqlite_uuid_to_bin, deterministic=True)
+        self._connection.create_function('BIN_TO_UUID', 1, _sqlite_bin_to_uuid, deterministic=True)
+        self._connection.create_function('BIN_TO_UUID', 2, _sqlite_bin_to_uuid, deterministic=True)
+        self._connection.create_function('RAND', 0, random.random)
+        self._connection.create_aggregate('STDDEV_POP', 1, _StddevPop)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def cursor(self, **kwargs):
+        # buffered=... and friends are mysql-connector options; sqlite3 always streams
+        return SQLiteCursor(self._connection.cursor())
+
+    def is_connected(self):
+        try:
+            self._connection.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+
+class CountingCursor:
+    """Cursor proxy that counts statements and fetch calls as round trips"""
+
+    def __init__(self, pool, cursor):
+        self._pool = pool
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        # Iterating fetches a row per step, so each counts like fetchone()
+        for row in self._cursor:
+            self._pool._count('round_trips')
+            yield row
+
+    def execute(self, *args, **kwargs):
+        self._pool._count('round_trips')
+        return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        self._pool._count('round_trips')
+        return self._cursor.executemany(*args, **kwargs)
+
+    def fetchone(self):
+        self._pool._count('round_trips')
+        return self._cursor.fetchone()
+
+    def fetchmany(self, *args, **kwargs):
+        self._pool._count('round_trips')
+        return self._cursor.fetchmany(*args, **kwargs)
+
+    def fetchall(self):
+        self._pool._count('round_trips')
+        return self._cursor.fetchall()
+
+
+class PooledConnection:
+    """Proxy around a pooled connection; close() hands it back to the pool"""
+
+    def __init__(self, pool, connection):
+        self._pool = pool
+        self._connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def cursor(self, *args, **kwargs):
+        return CountingCursor(self._pool, self._connection.cursor(*args, **kwargs))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self._connection is not None:
+            self._pool.release(self._connection)
+            self._connection = None
+
+
+class ConnectionPool:
+    """Thread-safe pool of MySQL connections
+
+    Connections are checked with a ping on checkout and recycled once they
+    are older than max_lifetime seconds. `metrics` counts checkouts, waits
+    for a free connection, connections created and discarded, and round
+    trips (statements and fetch calls made through pooled cursors).
+    """
+
+    def __init__(self, connect, size=5, max_lifetime=3600, checkout_timeout=30):
+        self.connect = connect
+        self.size = size
+        self.max_lifetime = max_lifetime
+        self.checkout_timeout = checkout_timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._created_at = {}
+        self._lock = threading.Lock()
+        self.metrics = {
+            'checkouts': 0,
+            'waits': 0,
+            'created': 0,
+            'recycled': 0,
+            'failed_health_checks': 0,
+            'round_trips': 0,
+        }
+
+    def _count(self, metric):
+        with self._lock:
+            self.metrics[metric] += 1
+
+    def _discard(self, connection):
+        self._created_at.pop(id(connection), None)
+        try:
+            connection.close()
+        except Error:
+            pass
+
+    def _is_usable(self, connection):
+        if time.monotonic() - self._created_at.get(id(connection), 0) > self.max_lifetime:
+            self._count('recycled')
+            return False
+        if not connection.is_connected():
+            self._count('failed_health_checks')
+            return False
+        return True
+
+    def get_connection(self):
+        """Checks out a healthy connection, opening one if none is idle"""
+        if not self._slots.acquire(blocking=False):
+            self._count('waits')
+            if not self._slots.acquire(timeout=self.checkout_timeout):
+                raise PoolError("Connection pool exhausted")
+        try:
+            connection = None
+            while connection is None:
+                try:
+                    connection = self._idle.get_nowait()
+                except queue.Empty:
+                    connection = self.connect()
+                    self._created_at[id(connection)] = time.monotonic()
+                    self._count('created')
+                    break
+                if not self._is_usable(connection):
+                    self._discard(connection)
+                    connection = None
+        except BaseException:
+            self._slots.release()
+            raise
+        self._count('checkouts')
+        return PooledConnection(self, connection)
+
+    def release(self, connection):
+        """Returns a connection to the pool, resetting any leftover state"""
+        try:
+            if connection.unread_result:
+                # Draining an abandoned stream would read the rest of it over
+                # the network; a new connection is cheaper
+                self._discard(connection)
+                return
+            if connection.in_transaction:
+                connection.rollback()
+            self._idle.put(connection)
+        except Error:
+            self._discard(connection)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """Closes every idle connection"""
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+
+def _mysql_connect_args(config, database):
+    if mysql is None:
+        raise ImportError("mysql-connector-python is required for the mysql backend")
+    connect_args = {
+        'host': config['host'],
+        'port': int(config['port']),
+        'user': config['user'],
+        'password': config['password'],
+    }
+    if database == 'default':
+        connect_args['database'] = config['database']
+    elif database is not None:
+        connect_args['database'] = database
+    return connect_args
+
+
+_pools = {}
+_pools_pid = None
+_pools_lock = threading.Lock()
+
+
+def get_pool(database='default'):
+    """Returns the process-wide pool for a database, creating it on first use
+
+    database='default' uses the configured database; None connects to the
+    server without selecting one.
+    """
+    global _pools_pid
+    with _pools_lock:
+        # Sockets inherited through fork must not be shared with the parent
+        if _pools_pid != os.getpid():
+            _pools.clear()
+            _pools_pid = os.getpid()
+        if database not in _pools:
+            config = load_config()
+            if config['backend'] == 'sqlite':
+                # A SQLite file is the whole database, whatever name is asked for
+                connect = functools.partial(SQLiteConnection, config['sqlite_path'])
+            else:
+                connect = functools.partial(mysql.connector.connect,
+                                            **_mysql_connect_args(config, database))
+            _pools[database] = ConnectionPool(
+                connect,
+                size=int(config['pool_size']),
+                max_lifetime=float(config['max_lifetime']),
+                checkout_timeout=float(config['checkout_timeout'])
+            )
+        return _pools[database]
+
+
+def connect(database='default'):
+    """Checks out a pooled connection; close() returns it to the pool"""
+    return get_pool(database).get_connection()
+
+
+def connect_local_infile(database='default'):
+    """Opens an unpooled MySQL connection that may send local files to the server
+
+    Only LOAD DATA LOCAL INFILE needs this. A connection allowed to do it
+    lets the server ask for any file the client can read, so pooled
+    connections never allow it.
+    """
+    config = load_config()
+    return mysql.connector.connect(allow_local_infile=True,
+                                   **_mysql_connect_args(config, database))
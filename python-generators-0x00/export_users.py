@@ -0,0 +1,184 @@
+import ast
+import os
+import shutil
+import struct
+import uuid
+from array import array
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+stream_users_in_batches = __import__('1-batch_processing').stream_users_in_batches
+
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+STRING_COLUMNS = ('name', 'email')
+
+
+def _to_columns(batch):
+    """Splits a fetchmany batch of rows into per-column lists"""
+    user_ids, names, emails, ages = (list(column) for column in zip(*batch))
+    return {
+        'user_id': user_ids,
+        'name': names,
+        'email': emails,
+        'age': [int(age) for age in ages],
+    }
+
+
+class NpyColumnWriter:
+    """Appends raw little-endian values to a .npy file, writing the header on close
+
+    The shape is only known once the stream ends, so values go to a .part
+    file first and are copied behind the header when the writer is closed.
+    """
+
+    def __init__(self, path, descr, item_shape=()):
+        self.path = path
+        self.descr = descr
+        self.item_shape = item_shape
+        self.count = 0
+        self._part = open(path + '.part', 'wb')
+
+    def append(self, data, count):
+        self._part.write(data)
+        self.count += count
+
+    def close(self):
+        self._part.close()
+        header = repr({
+            'descr': self.descr,
+            'fortran_order': False,
+            'shape': (self.count,) + self.item_shape,
+        })
+        # Header is padded so the data starts on a 64-byte boundary
+        padding = 64 - (len(NPY_MAGIC) + 2 + len(header) + 1) % 64
+        header = (header + ' ' * padding + '\n').encode('latin1')
+        with open(self.path, 'wb') as f, open(self.path + '.part', 'rb') as part:
+            f.write(NPY_MAGIC + struct.pack('<H', len(header)) + header)
+            shutil.copyfileobj(part, f)
+        os.remove(self.path + '.part')
+
+    def discard(self):
+        """Closes the writer without writing the .npy file, removing its .part file"""
+        self._part.close()
+        os.remove(self.path + '.part')
+
+
+def _export_npy(directory, batches):
+    """Writes one .npy file per column
+
+    user_id is stored as 16-byte binary UUIDs, age as uint16, and strings
+    as a UTF-8 byte blob plus an int64 offsets array (Arrow layout).
+    """
+    os.makedirs(directory, exist_ok=True)
+    writers = {}
+    rows = 0
+    try:
+        writers['user_id'] = NpyColumnWriter(
+            os.path.join(directory, 'user_id.npy'), '|u1', (16,))
+        writers['age'] = NpyColumnWriter(os.path.join(directory, 'age.npy'), '<u2')
+        for column in STRING_COLUMNS:
+            writers[column] = NpyColumnWriter(os.path.join(directory, f'{column}.npy'), '|u1')
+            writers[f'{column}.offsets'] = NpyColumnWriter(
+                os.path.join(directory, f'{column}.offsets.npy'), '<i8')
+            writers[f'{column}.offsets'].append(struct.pack('<q', 0), 1)
+
+        for batch in batches:
+            columns = _to_columns(batch)
+            rows += len(batch)
+            writers['user_id'].append(
+                b''.join(uuid.UUID(user_id).bytes for user_id in columns['user_id']),
+                len(batch))
+            writers['age'].append(array('H', columns['age']).tobytes(), len(batch))
+            for column in STRING_COLUMNS:
+                encoded = [value.encode('utf-8') for value in columns[column]]
+                ends = array('q')
+                end = writers[column].count
+                for value in encoded:
+                    end += len(value)
+                    ends.append(end)
+                data = b''.join(encoded)
+                writers[column].append(data, len(data))
+                writers[f'{column}.offsets'].append(ends.tobytes(), len(ends))
+    except BaseException:
+        # A failed export leaves no files behind rather than truncated ones
+        for writer in writers.values():
+            writer.discard()
+        raise
+
+    for writer in writers.values():
+        writer.close()
+    return rows
+
+
+def _export_arrow(path, batches, fmt):
+    """Writes each batch as an Arrow record batch to a Parquet or IPC file"""
+    schema = pyarrow.schema([
+        ('user_id', pyarrow.string()),
+        ('name', pyarrow.string()),
+        ('email', pyarrow.string()),
+        ('age', pyarrow.uint16()),
+    ])
+    if fmt == 'parquet':
+        writer = pyarrow.parquet.ParquetWriter(path, schema, compression='zstd')
+        write = writer.write_batch
+    else:
+        writer = pyarrow.ipc.new_file(path, schema)
+        write = writer.write_batch
+
+    rows = 0
+    try:
+        for batch in batches:
+            write(pyarrow.record_batch(_to_columns(batch), schema=schema))
+            rows += len(batch)
+    except BaseException:
+        writer.close()
+        os.remove(path)
+        raise
+    writer.close()
+    return rows
+
+
+def export_users(path, fmt='parquet', batch_size=10000, **predicates):
+    """Exports user_data to a columnar file, one fetchmany batch at a time
+
+    fmt is 'parquet' or 'arrow' (IPC file), both requiring pyarrow, or
+    'npy' for a directory of per-column .npy files that needs no third-party
+    packages. Predicates are passed through to stream_users_in_batches.
+    Returns the number of rows written. A database error is raised and
+    the partly written output removed.
+    """
+    batches = stream_users_in_batches(batch_size, raise_errors=True, **predicates)
+    if fmt == 'npy':
+        return _export_npy(path, batches)
+    if fmt not in ('parquet', 'arrow'):
+        raise ValueError(f"Unknown export format: {fmt}")
+    if pyarrow is None:
+        raise ImportError(f"pyarrow is required for {fmt} exports, use fmt='npy' instead")
+    return _export_arrow(path, batches, fmt)
+
+
+def read_npy(path):
+    """Reads a .npy file written by export_users into (descr, shape, raw bytes)"""
+    with open(path, 'rb') as f:
+        if f.read(len(NPY_MAGIC)) != NPY_MAGIC:
+            raise ValueError(f"{path} is not a version 1.0 .npy file")
+        (header_len,) = struct.unpack('<H', f.read(2))
+        header = ast.literal_eval(f.read(header_len).decode('latin1'))
+        return header['descr'], header['shape'], f.read()
+
+
+def read_npy_column(directory, column):
+    """Loads one exported column back as a list of Python values"""
+    _, _, data = read_npy(os.path.join(directory, f'{column}.npy'))
+    if column == 'user_id':
+        return [str(uuid.UUID(bytes=data[i:i + 16])) for i in range(0, len(data), 16)]
+    if column == 'age':
+        return array('H', data).tolist()
+    _, _, raw_offsets = read_npy(os.path.join(directory, f'{column}.offsets.npy'))
+    offsets = array('q', raw_offsets)
+    return [data[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:])]
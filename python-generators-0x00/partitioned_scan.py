@@ -0,0 +1,120 @@
+import multiprocessing
+
+import db
+
+# Connection held by each worker process, opened once by _init_worker
+_worker_connection = None
+
+
+def connect_to_prodev():
+    """Checks out a pooled connection to the ALX_prodev database"""
+    return db.connect()
+
+
+def prefix_split_points(connection, partitions):
+    """Returns user_id split points spread evenly between the smallest and largest key
+
+    Keys are BINARY(16); their first 8 bytes are treated as an integer and
+    the span between MIN and MAX is cut into equal slices. Email-derived
+    UUIDv5 keys are uniform within that span, so this gives ranges of
+    roughly equal size from two index lookups.
+    """
+    cursor = connection.cursor()
+    cursor.execute("SELECT MIN(user_id), MAX(user_id) FROM user_data")
+    low, high = cursor.fetchone()
+    cursor.close()
+    if low is None:
+        return []
+    low = int.from_bytes(bytes(low)[:8], 'big')
+    high = int.from_bytes(bytes(high)[:8], 'big')
+    points = {(low + i * (high - low) // partitions).to_bytes(8, 'big') + bytes(8)
+              for i in range(1, partitions)}
+    return sorted(points)
+
+
+def sampled_split_points(connection, partitions, sample_fraction=0.001):
+    """Returns user_id split points taken from quantiles of a random key sample"""
+    cursor = connection.cursor()
+    cursor.execute("SELECT user_id FROM user_data WHERE RAND() < %s", (sample_fraction,))
+    sample = sorted(bytes(user_id) for (user_id,) in cursor.fetchall())
+    cursor.close()
+    if not sample:
+        return []
+    points = {sample[i * len(sample) // partitions] for i in range(1, partitions)}
+    return sorted(points)
+
+
+def key_ranges(split_points):
+    """Turns sorted split points into contiguous (low, high) user_id ranges"""
+    bounds = [None] + list(split_points) + [None]
+    return list(zip(bounds, bounds[1:]))
+
+
+def _init_worker():
+    """Opens the connection a worker process reuses for all of its ranges"""
+    global _worker_connection
+    _worker_connection = connect_to_prodev()
+
+
+def _scan_range(task):
+    """Scans one user_id range on the worker's connection
+
+    Returns the rows of the range in user_id order, or the concatenated
+    output of map_func applied to each fetched batch.
+    """
+    (low, high), batch_size, map_func = task
+    clauses = []
+    params = []
+    if low is not None:
+        clauses.append("user_data.user_id >= %s")
+        params.append(low)
+    if high is not None:
+        clauses.append("user_data.user_id < %s")
+        params.append(high)
+    where_sql = " WHERE " + " AND ".join(clauses) if clauses else ""
+
+    cursor = _worker_connection.cursor()
+    cursor.execute(
+        f"SELECT {db.USER_COLUMNS} FROM user_data" + where_sql + " ORDER BY user_data.user_id",
+        params
+    )
+    results = []
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        results.extend(map_func(batch) if map_func else batch)
+    cursor.close()
+    return results
+
+
+def partitioned_scan(workers=4, partitions=None, ordered=False, map_func=None,
+                     batch_size=1000, split='prefix'):
+    """Generator that scans user_data in parallel key ranges across processes
+
+    The table is split into `partitions` user_id ranges (default 4 per
+    worker, so a slow range doesn't stall the pool) using either evenly
+    spaced key prefixes or sampled split points. Each worker process holds
+    its own connection. With ordered=True results come back in user_id
+    order, otherwise as soon as each range finishes. map_func, if given,
+    must be a picklable top-level function taking a batch of rows and
+    returning an iterable of results; it runs inside the workers.
+    """
+    partitions = partitions or workers * 4
+    if split not in ('prefix', 'sample'):
+        raise ValueError(f"Unknown split method: {split}")
+    connection = connect_to_prodev()
+    try:
+        if split == 'prefix':
+            points = prefix_split_points(connection, partitions)
+        else:
+            points = sampled_split_points(connection, partitions)
+    finally:
+        connection.close()
+
+    tasks = [(key_range, batch_size, map_func) for key_range in key_ranges(points)]
+    with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+        scan = pool.imap if ordered else pool.imap_unordered
+        for results in scan(_scan_range, tasks):
+            for result in results:
+                yield result
@@ -1,21 +1,123 @@
-import mysql.connector
+import db
+import csv_pipeline
 import uuid
 import csv
+import json
 import os
+import time
+
+# Namespace for the deterministic, email-derived user_id values
+USER_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_DNS, 'ALX_prodev.user_data')
+
+USER_DATA_DDL = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        user_id BINARY(16) PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        email VARCHAR(255) NOT NULL,
+        age DECIMAL NOT NULL,
+        created_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+        INDEX idx_user_data_age (age),
+        INDEX idx_user_data_email (email),
+        INDEX idx_user_data_created_at (created_at, user_id)
+    )
+"""
+
+# Mirror writes to user_data into user_data_new while migrate_user_data copies it
+MIGRATION_TRIGGERS = {
+    'user_data_migrate_insert': """
+        CREATE TRIGGER user_data_migrate_insert AFTER INSERT ON user_data
+        FOR EACH ROW REPLACE INTO user_data_new (user_id, name, email, age)
+            VALUES (UUID_TO_BIN(NEW.user_id, 1), NEW.name, NEW.email, NEW.age)
+    """,
+    'user_data_migrate_update': """
+        CREATE TRIGGER user_data_migrate_update AFTER UPDATE ON user_data
+        FOR EACH ROW BEGIN
+            DELETE FROM user_data_new WHERE user_id = UUID_TO_BIN(OLD.user_id, 1);
+            REPLACE INTO user_data_new (user_id, name, email, age)
+                VALUES (UUID_TO_BIN(NEW.user_id, 1), NEW.name, NEW.email, NEW.age);
+        END
+    """,
+    'user_data_migrate_delete': """
+        CREATE TRIGGER user_data_migrate_delete AFTER DELETE ON user_data
+        FOR EACH ROW DELETE FROM user_data_new WHERE user_id = UUID_TO_BIN(OLD.user_id, 1)
+    """,
+}
+
+CREATE_TABLE_SQL = {
+    'mysql': [USER_DATA_DDL.format(table='user_data')],
+    'sqlite': [
+        """
+        CREATE TABLE IF NOT EXISTS user_data (
+            user_id BLOB PRIMARY KEY,
+            name TEXT NOT NULL,
+            email TEXT NOT NULL,
+            age NUMERIC NOT NULL,
+            created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_user_data_age ON user_data (age)",
+        "CREATE INDEX IF NOT EXISTS idx_user_data_email ON user_data (email)",
+        "CREATE INDEX IF NOT EXISTS idx_user_data_created_at ON user_data (created_at, user_id)",
+    ],
+}
+
+# Adds the created_at high-water mark column that tail_users follows
+ADD_CREATED_AT_SQL = {
+    'mysql': [
+        """
+        ALTER TABLE user_data
+            ADD COLUMN created_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+            ADD INDEX idx_user_data_created_at (created_at, user_id)
+        """,
+    ],
+    # SQLite can't add a column with a non-constant default, so rebuild the table
+    'sqlite': [
+        "DROP INDEX IF EXISTS idx_user_data_age",
+        "DROP INDEX IF EXISTS idx_user_data_email",
+        "ALTER TABLE user_data RENAME TO user_data_old",
+    ] + CREATE_TABLE_SQL['sqlite'] + [
+        """
+        INSERT INTO user_data (user_id, name, email, age)
+        SELECT user_id, name, email, age FROM user_data_old
+        """,
+        "DROP TABLE user_data_old",
+    ],
+}
+
+# UUIDv5 of the trimmed, lowercased @email in SQL, the key user_id_for_email
+# computes: the first 16 bytes of SHA1(namespace + name) with the version
+# nibble set to 5 and the variant bits to 10
+_EMAIL_SHA1_SQL = f"SHA1(CONCAT(UNHEX('{USER_ID_NAMESPACE.hex}'), LOWER(TRIM(@email))))"
+EMAIL_UUID_SQL = (
+    f"CONCAT(SUBSTR({_EMAIL_SHA1_SQL}, 1, 12), '5', SUBSTR({_EMAIL_SHA1_SQL}, 14, 3), "
+    f"HEX(CONV(SUBSTR({_EMAIL_SHA1_SQL}, 17, 1), 16, 10) & 3 | 8), "
+    f"SUBSTR({_EMAIL_SHA1_SQL}, 18, 15))"
+)
+
+UPSERT_USER_SQL = {
+    'mysql': """
+        INSERT INTO user_data (user_id, name, email, age)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            name = VALUES(name), email = VALUES(email), age = VALUES(age)
+    """,
+    'sqlite': """
+        INSERT INTO user_data (user_id, name, email, age)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (user_id) DO UPDATE SET
+            name = excluded.name, email = excluded.email, age = excluded.age
+    """,
+}
 
 
 
 
 def connect_db():  
-    """Connects to MySQL server (without a specific DB)"""
+    """Connects to the database server (without a specific DB)"""
     try:
-        return mysql.connector.connect(
-            host="localhost",
-            user="your_mysql_user",
-            password="your_mysql_password"
-        )
-    except mysql.connector.Error as err:
-        print(f"Error connecting to MySQL: {err}")
+        return db.connect(database=None)
+    except db.Error as err:
+        print(f"Error connecting to database server: {err}")
         return None
 
 
@@ -23,12 +125,15 @@ def connect_db():
 
 def create_database(connection): 
     """Creates the ALX_prodev database if it doesn't exist"""
+    if db.backend() == 'sqlite':
+        # The SQLite file is created on connect
+        return
     try:
         cursor = connection.cursor()
         cursor.execute("CREATE DATABASE IF NOT EXISTS ALX_prodev")
         connection.commit()
         cursor.close()
-    except mysql.connector.Error as err:
+    except db.Error as err:
         print(f"Error creating database: {err}")
 
 
@@ -37,13 +142,8 @@ def create_database(connection):
 def connect_to_prodev():
     """Connects to the ALX_prodev database"""
     try:
-        return mysql.connector.connect(
-            host="localhost",
-            user="your_mysql_user",
-            password="your_mysql_password",
-            database="ALX_prodev"
-        )
-    except mysql.connector.Error as err:
+        return db.connect()
+    except db.Error as err:
         print(f"Error connecting to ALX_prodev: {err}")
         return None
 
@@ -54,48 +154,468 @@ def create_table(connection):
     """Creates the user_data table in the ALX_prodev database"""
     try:
         cursor = connection.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_data (
-                user_id CHAR(36) PRIMARY KEY,
-                name VARCHAR(255) NOT NULL,
-                email VARCHAR(255) NOT NULL,
-                age DECIMAL NOT NULL,
-                INDEX(user_id)
-            )
-        """)
+        for statement in CREATE_TABLE_SQL[db.backend()]:
+            cursor.execute(statement)
         connection.commit()
         print("Table user_data created successfully")
         cursor.close()
-    except mysql.connector.Error as err:
+    except db.Error as err:
         print(f"Error creating table: {err}")
 
 
 
 
-def insert_data(connection, csv_file):
-    """Inserts data from a CSV file into the user_data table"""
+def user_id_for_email(email):
+    """Returns a deterministic UUIDv5 user_id derived from the email address"""
+    return str(uuid.uuid5(USER_ID_NAMESPACE, email.strip().lower()))
+
+
+
+
+def user_key_for_email(email):
+    """Returns the BINARY(16) user_id key stored for an email address"""
+    return db.uuid_to_bin(user_id_for_email(email))
+
+
+
+
+def read_checkpoint(checkpoint_file, csv_file):
+    """Returns the saved checkpoint for csv_file, or None if it is missing or stale"""
+    try:
+        with open(checkpoint_file, encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # A checkpoint taken against a different version of the file, or
+    # written for another database, is useless
+    if checkpoint.get('size') != os.path.getsize(csv_file):
+        return None
+    if checkpoint.get('target') != db.target():
+        return None
+    return checkpoint
+
+
+
+
+def write_checkpoint(checkpoint_file, csv_file, offset, rows, last_email):
+    """Atomically records the byte offset, row count and last email of the last committed batch"""
+    checkpoint = {
+        'offset': offset,
+        'rows': rows,
+        'last_email': last_email,
+        'size': os.path.getsize(csv_file),
+        'target': db.target(),
+    }
+    tmp_file = checkpoint_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_file, checkpoint_file)
+
+
+
+
+def has_user(connection, email):
+    """Returns True if user_data holds the row keyed by an email address"""
+    cursor = connection.cursor()
+    cursor.execute("SELECT 1 FROM user_data WHERE user_id = %s", (user_key_for_email(email),))
+    found = cursor.fetchone() is not None
+    cursor.close()
+    return found
+
+
+
+
+def uses_email_keys(connection):
+    """Returns False if user_data holds rows keyed by something other than their email
+
+    Tables seeded before keys were derived from the email have random
+    UUIDv4 keys; upserting into them would store every row a second time.
+    """
+    cursor = connection.cursor()
+    cursor.execute("SELECT user_id, email FROM user_data LIMIT 1")
+    row = cursor.fetchone()
+    cursor.close()
+    if row is None:
+        return True
+    user_id, email = row
+    if isinstance(user_id, str):
+        return user_id == user_id_for_email(email)
+    return bytes(user_id) == user_key_for_email(email)
+
+
+
+
+def read_header(f):
+    """Reads the header row of an open CSV file, or returns None if it lacks user columns"""
+    line = f.readline()
+    if isinstance(line, bytes):
+        line = line.decode('utf-8')
+    header = next(csv.reader([line]), [])
+    if not {'name', 'email', 'age'}.issubset(header):
+        return None
+    return header
+
+
+
+
+def insert_data(connection, csv_file, batch_size=1000, checkpoint_file=None):
+    """Upserts data from a CSV file into user_data, resuming from the last checkpoint
+
+    Rows are keyed by an email-derived UUIDv5, so replaying a batch that was
+    committed but not yet checkpointed is a no-op. The CSV is read line by
+    line, so quoted fields must not contain newlines.
+    """
     try:
         if not os.path.exists(csv_file):
             print(f"{csv_file} not found.")
             return
 
+        if not uses_email_keys(connection):
+            print("user_data has keys that aren't derived from email. Skipping insert.")
+            return
+
+        if checkpoint_file is None:
+            checkpoint_file = csv_file + '.checkpoint'
+        checkpoint = read_checkpoint(checkpoint_file, csv_file)
+        # The table may have been dropped or emptied since the checkpoint. Its
+        # row count can't tell: upserts merge rows that repeat an email
+        if checkpoint and not has_user(connection, checkpoint.get('last_email', '')):
+            checkpoint = None
+        rows_done = checkpoint['rows'] if checkpoint else 0
+
+        upsert_sql = UPSERT_USER_SQL[db.backend()]
         cursor = connection.cursor()
-        cursor.execute("SELECT COUNT(*) FROM user_data")
-        if cursor.fetchone()[0] > 0:
-            print("Data already exists. Skipping insert.")
+        with open(csv_file, 'rb') as f:
+            header = read_header(f)
+            if header is None:
+                print(f"{csv_file} has no name, email and age header. Nothing to insert.")
+                cursor.close()
+                return
+            if checkpoint:
+                f.seek(checkpoint['offset'])
+                print(f"Resuming after row {rows_done}.")
+
+            name_col = header.index('name')
+            email_col = header.index('email')
+            age_col = header.index('age')
+            batch = []
+            while True:
+                line = f.readline()
+                if line.strip():
+                    row = next(csv.reader([line.decode('utf-8')]))
+                    batch.append((user_key_for_email(row[email_col]), row[name_col],
+                                  row[email_col], row[age_col]))
+                if batch and (len(batch) == batch_size or not line):
+                    cursor.executemany(upsert_sql, batch)
+                    connection.commit()
+                    rows_done += len(batch)
+                    write_checkpoint(checkpoint_file, csv_file, f.tell(), rows_done,
+                                     batch[-1][2])
+                    batch = []
+                if not line:
+                    break
+
+        print(f"Data inserted successfully ({rows_done} rows).")
+        cursor.close()
+    except db.Error as err:
+        print(f"Error inserting data: {err}")
+
+
+
+
+def insert_data_per_row(connection, csv_file):
+    """Inserts data from a CSV file into user_data with one INSERT per row"""
+    try:
+        if not os.path.exists(csv_file):
+            print(f"{csv_file} not found.")
             return
 
+        with open(csv_file, newline='', encoding='utf-8') as f:
+            if read_header(f) is None:
+                print(f"{csv_file} has no name, email and age header. Nothing to insert.")
+                return
+
+        cursor = connection.cursor()
         with open(csv_file, newline='', encoding='utf-8') as f:
             reader = csv.DictReader(f)
             for row in reader:
-                uid = str(uuid.uuid4())
                 cursor.execute("""
                     INSERT INTO user_data (user_id, name, email, age)
                     VALUES (%s, %s, %s, %s)
-                """, (uid, row['name'], row['email'], row['age']))
+                """, (user_key_for_email(row['email']), row['name'], row['email'], row['age']))
 
         connection.commit()
         print("Data inserted successfully.")
         cursor.close()
-    except mysql.connector.Error as err:
+    except db.Error as err:
         print(f"Error inserting data: {err}")
+
+
+
+
+def read_csv_in_chunks(csv_file, chunk_size):
+    """Yields lists of (user_id, name, email, age) rows read from the CSV file"""
+    with open(csv_file, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        chunk = []
+        for row in reader:
+            chunk.append((user_key_for_email(row['email']), row['name'], row['email'], row['age']))
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+
+
+def load_data_infile(csv_file):
+    """Loads the CSV file server-side with LOAD DATA LOCAL INFILE, returns row count
+
+    Uses its own connection, the only one allowed to send local files.
+    """
+    with open(csv_file, newline='', encoding='utf-8') as f:
+        header = read_header(f)
+    # Columns the table doesn't have are read into a variable and dropped
+    targets = {'name': 'name', 'email': '@email', 'age': 'age'}
+    columns = ', '.join(targets.get(column, '@unused') for column in header)
+    connection = db.connect_local_infile()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"""
+            LOAD DATA LOCAL INFILE %s INTO TABLE user_data
+            CHARACTER SET utf8mb4
+            FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"' ESCAPED BY ''
+            LINES TERMINATED BY '\\n'
+            IGNORE 1 LINES
+            ({columns})
+            SET email = @email, user_id = UUID_TO_BIN({EMAIL_UUID_SQL}, 1)
+        """, (os.path.abspath(csv_file),))
+        connection.commit()
+        inserted = cursor.rowcount
+        cursor.close()
+        return inserted
+    finally:
+        connection.close()
+
+
+
+
+def insert_data_bulk(connection, csv_file, batch_size=1000, commit_every=10,
+                     use_load_data=True):
+    """Bulk inserts a CSV file into user_data using LOAD DATA or executemany batches"""
+    try:
+        if not os.path.exists(csv_file):
+            print(f"{csv_file} not found.")
+            return 0
+
+        with open(csv_file, newline='', encoding='utf-8') as f:
+            if read_header(f) is None:
+                print(f"{csv_file} has no name, email and age header. Nothing to insert.")
+                return 0
+
+        cursor = connection.cursor()
+        cursor.execute("SELECT COUNT(*) FROM user_data")
+        if cursor.fetchone()[0] > 0:
+            print("Data already exists. Skipping insert.")
+            cursor.close()
+            return 0
+
+        start = time.perf_counter()
+        inserted = None
+        upsert_sql = UPSERT_USER_SQL[db.backend()]
+        if use_load_data and db.backend() == 'mysql':
+            try:
+                inserted = load_data_infile(csv_file)
+            except db.Error as err:
+                # Server or client has local_infile disabled, use batches instead
+                print(f"LOAD DATA unavailable ({err}), falling back to batches.")
+
+        if inserted is None:
+            inserted = 0
+            pending = 0
+            for chunk in read_csv_in_chunks(csv_file, batch_size):
+                cursor.executemany(upsert_sql, chunk)
+                inserted += len(chunk)
+                pending += 1
+                if pending == commit_every:
+                    connection.commit()
+                    pending = 0
+            connection.commit()
+
+        elapsed = time.perf_counter() - start
+        rate = inserted / elapsed if elapsed > 0 else 0
+        print(f"Inserted {inserted} rows in {elapsed:.2f}s ({rate:,.0f} rows/sec).")
+        cursor.close()
+        return inserted
+    except db.Error as err:
+        print(f"Error inserting data: {err}")
+        return 0
+
+
+
+
+def insert_data_validated(connection, csv_file, batch_size=1000, workers=None):
+    """Upserts a CSV file after parallel parsing and validation in csv_pipeline
+
+    Invalid and duplicate rows are written to <csv_file>.rejected.csv
+    instead of failing inside the database.
+    """
+    try:
+        if not os.path.exists(csv_file):
+            print(f"{csv_file} not found.")
+            return 0
+
+        if not uses_email_keys(connection):
+            print("user_data has keys that aren't derived from email. Skipping insert.")
+            return 0
+
+        upsert_sql = UPSERT_USER_SQL[db.backend()]
+        cursor = connection.cursor()
+        start = time.perf_counter()
+        inserted = 0
+        for batch in csv_pipeline.validated_batches(csv_file, batch_size, workers):
+            cursor.executemany(upsert_sql, [
+                (user_key_for_email(email), name, email, age) for name, email, age in batch
+            ])
+            connection.commit()
+            inserted += len(batch)
+
+        elapsed = time.perf_counter() - start
+        rate = inserted / elapsed if elapsed > 0 else 0
+        print(f"Inserted {inserted} valid rows in {elapsed:.2f}s ({rate:,.0f} rows/sec).")
+        cursor.close()
+        return inserted
+    except db.Error as err:
+        print(f"Error inserting data: {err}")
+        return 0
+
+
+
+def user_id_is_binary(connection):
+    """Returns True once user_data uses BINARY(16) user_id keys"""
+    cursor = connection.cursor()
+    if db.backend() == 'sqlite':
+        cursor.execute("PRAGMA table_info(user_data)")
+        types = {name: declared for _, name, declared, *_ in cursor.fetchall()}
+        cursor.close()
+        return types.get('user_id', '').upper() in ('BLOB', 'BINARY(16)')
+    cursor.execute("""
+        SELECT DATA_TYPE FROM INFORMATION_SCHEMA.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'user_data'
+          AND COLUMN_NAME = 'user_id'
+    """)
+    row = cursor.fetchone()
+    cursor.close()
+    if row is None:
+        return False
+    data_type = row[0].decode() if isinstance(row[0], bytes) else row[0]
+    return data_type.lower() == 'binary'
+
+
+
+
+def user_data_columns(connection):
+    """Returns the column names of the user_data table"""
+    cursor = connection.cursor()
+    cursor.execute("SELECT * FROM user_data LIMIT 0")
+    cursor.fetchall()
+    columns = [column[0] for column in cursor.description]
+    cursor.close()
+    return columns
+
+
+
+
+def add_created_at(connection):
+    """Adds the created_at column and index to a user_data table that lacks them
+
+    Rows that already exist get the time of the upgrade as their created_at.
+    """
+    try:
+        if 'created_at' in user_data_columns(connection):
+            return False
+        cursor = connection.cursor()
+        if db.backend() == 'sqlite':
+            cursor.execute("BEGIN")
+        for statement in ADD_CREATED_AT_SQL[db.backend()]:
+            cursor.execute(statement)
+        connection.commit()
+        cursor.close()
+        print("Added created_at to user_data.")
+        return True
+    except db.Error as err:
+        connection.rollback()
+        print(f"Error adding created_at: {err}")
+        return False
+
+
+
+
+def drop_migration_triggers(cursor):
+    """Removes the triggers installed by migrate_user_data"""
+    for name in MIGRATION_TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+
+
+def migrate_user_data(connection, chunk_size=10000, keep_old=False):
+    """Rewrites a CHAR(36)-keyed user_data table to the current schema online
+
+    The new table has BINARY(16) keys, no duplicate user_id index, and
+    indexes on age and email. Rows are copied in primary-key chunks, each
+    committed on its own, while triggers mirror concurrent writes into the
+    new table. The tables are then swapped with one atomic RENAME. Creating
+    triggers needs the TRIGGER privilege (and SUPER or
+    log_bin_trust_function_creators when binary logging is on).
+    """
+    try:
+        if user_id_is_binary(connection):
+            print("user_data already uses binary keys. Skipping migration.")
+            return 0
+        if db.backend() != 'mysql':
+            print("Online migration is only supported on MySQL.")
+            return 0
+
+        cursor = connection.cursor()
+        drop_migration_triggers(cursor)
+        cursor.execute("DROP TABLE IF EXISTS user_data_new")
+        cursor.execute(USER_DATA_DDL.format(table='user_data_new'))
+        for statement in MIGRATION_TRIGGERS.values():
+            cursor.execute(statement)
+
+        start = time.perf_counter()
+        copied = 0
+        last_id = ''
+        while True:
+            cursor.execute("""
+                SELECT MAX(user_id) FROM (
+                    SELECT user_id FROM user_data WHERE user_id > %s
+                    ORDER BY user_id LIMIT %s
+                ) AS chunk
+            """, (last_id, chunk_size))
+            chunk_end = cursor.fetchone()[0]
+            if chunk_end is None:
+                break
+            # IGNORE keeps rows the triggers already wrote, which are newer
+            cursor.execute("""
+                INSERT IGNORE INTO user_data_new (user_id, name, email, age)
+                SELECT UUID_TO_BIN(user_id, 1), name, email, age FROM user_data
+                WHERE user_id > %s AND user_id <= %s
+            """, (last_id, chunk_end))
+            connection.commit()
+            copied += cursor.rowcount
+            last_id = chunk_end
+
+        cursor.execute("RENAME TABLE user_data TO user_data_old, user_data_new TO user_data")
+        drop_migration_triggers(cursor)
+        if not keep_old:
+            cursor.execute("DROP TABLE user_data_old")
+        connection.commit()
+        cursor.close()
+        print(f"Migrated {copied} rows to binary keys in {time.perf_counter() - start:.2f}s.")
+        return copied
+    except db.Error as err:
+        print(f"Error migrating user_data: {err}")
+        return 0
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Unit tests for resumable loading in the seed module."""
+
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import db
+import seed
+
+ROWS = [
+    ("Ann", "ann@example.com", 30),
+    ("Ann", "ann@example.com", 31),
+    ("Ann", "ann@example.com", 32),
+    ("Ann", "ann@example.com", 33),
+    ("Bob", "bob@example.com", 41),
+    ("Cid", "cid@example.com", 52),
+    ("Dee", "dee@example.com", 63),
+]
+
+
+class TestInsertDataCheckpoint(unittest.TestCase):
+    """Test case for resuming insert_data() from its checkpoint."""
+
+    def setUp(self) -> None:
+        """Point the sqlite backend at a fresh database and write the CSV."""
+        self.tmp = tempfile.mkdtemp()
+        env = {'PRODEV_BACKEND': 'sqlite',
+               'PRODEV_SQLITE_PATH': os.path.join(self.tmp, 'ALX_prodev.sqlite3')}
+        self.env = patch.dict(os.environ, env)
+        self.env.start()
+        db._pools.clear()
+        self.csv_file = os.path.join(self.tmp, 'user_data.csv')
+        with open(self.csv_file, 'w', encoding='utf-8') as f:
+            f.write("name,email,age\n")
+            for row in ROWS:
+                f.write("%s,%s,%d\n" % row)
+        self.connection = db.connect()
+        with contextlib.redirect_stdout(io.StringIO()):
+            seed.create_table(self.connection)
+
+    def tearDown(self) -> None:
+        """Close the pool and remove the database and CSV."""
+        self.connection.close()
+        for pool in db._pools.values():
+            pool.close()
+        db._pools.clear()
+        self.env.stop()
+        shutil.rmtree(self.tmp)
+
+    def insert(self) -> str:
+        """Run insert_data in batches of two and return what it printed."""
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            seed.insert_data(self.connection, self.csv_file, batch_size=2)
+        return out.getvalue()
+
+    def emails(self) -> list:
+        """Return the emails stored in user_data."""
+        cursor = self.connection.cursor()
+        cursor.execute("SELECT email FROM user_data ORDER BY email")
+        emails = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+        return emails
+
+    def test_resume_after_merged_duplicates(self) -> None:
+        """Test a checkpoint is used when upserts merged rows sharing an email."""
+        write_checkpoint = seed.write_checkpoint
+        calls = []
+
+        def crash_on_third(*args):
+            calls.append(args)
+            if len(calls) == 3:
+                raise RuntimeError("crash")
+            write_checkpoint(*args)
+
+        with patch.object(seed, 'write_checkpoint', side_effect=crash_on_third):
+            with self.assertRaises(RuntimeError):
+                self.insert()
+        output = self.insert()
+        self.assertIn("Resuming after row 4.", output)
+        self.assertIn("(7 rows)", output)
+        self.assertEqual(self.emails(), ["ann@example.com", "bob@example.com",
+                                         "cid@example.com", "dee@example.com"])
+
+    def test_checkpoint_ignored_after_table_emptied(self) -> None:
+        """Test a checkpoint is discarded when its last row is gone."""
+        self.insert()
+        cursor = self.connection.cursor()
+        cursor.execute("DELETE FROM user_data")
+        self.connection.commit()
+        cursor.close()
+        output = self.insert()
+        self.assertNotIn("Resuming", output)
+        self.assertEqual(len(self.emails()), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import sys
+import uuid
+from array import array
+
+FIELDS = ('user_id', 'name', 'email', 'age')
+
+
+class UserRecord:
+    """Compact user row: 16-byte binary UUID, int age, interned strings
+
+    Supports index access like the driver's tuples, so code written
+    against plain rows (e.g. row[0]) keeps working.
+    """
+
+    __slots__ = ('_user_id', 'name', 'email', 'age')
+
+    def __init__(self, user_id, name, email, age):
+        self._user_id = user_id if isinstance(user_id, bytes) else uuid.UUID(user_id).bytes
+        self.name = sys.intern(name)
+        self.email = email
+        self.age = int(age)
+
+    @classmethod
+    def from_row(cls, row):
+        """Builds a record from a (user_id, name, email, age) row"""
+        return cls(*row)
+
+    @property
+    def user_id(self):
+        return str(uuid.UUID(bytes=self._user_id))
+
+    def as_tuple(self):
+        return (self.user_id, self.name, self.email, self.age)
+
+    def as_dict(self):
+        return dict(zip(FIELDS, self.as_tuple()))
+
+    def __getitem__(self, index):
+        return self.as_tuple()[index]
+
+    def __eq__(self, other):
+        if not isinstance(other, UserRecord):
+            return NotImplemented
+        return (self._user_id, self.name, self.email, self.age) == \
+            (other._user_id, other.name, other.email, other.age)
+
+    def __repr__(self):
+        return f"UserRecord{self.as_tuple()!r}"
+
+
+class UserBatch:
+    """Struct-of-arrays batch of users
+
+    user_ids are packed 16 bytes each, ages are an array('H') and names and
+    emails are UTF-8 blobs with end offsets, so a million users cost a few
+    dozen bytes each instead of several Python objects per row.
+    """
+
+    def __init__(self):
+        self.user_ids = bytearray()
+        self.ages = array('H')
+        self.names = bytearray()
+        self.name_ends = array('Q')
+        self.emails = bytearray()
+        self.email_ends = array('Q')
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Builds a batch from an iterable of (user_id, name, email, age) rows"""
+        batch = cls()
+        batch.extend(rows)
+        return batch
+
+    def append(self, row):
+        user_id, name, email, age = row
+        self.user_ids += user_id if isinstance(user_id, bytes) else uuid.UUID(user_id).bytes
+        self.ages.append(int(age))
+        self.names += name.encode('utf-8')
+        self.name_ends.append(len(self.names))
+        self.emails += email.encode('utf-8')
+        self.email_ends.append(len(self.emails))
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def __len__(self):
+        return len(self.ages)
+
+    def _string(self, blob, ends, index):
+        start = ends[index - 1] if index else 0
+        return blob[start:ends[index]].decode('utf-8')
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("UserBatch index out of range")
+        return UserRecord(
+            bytes(self.user_ids[index * 16:(index + 1) * 16]),
+            self._string(self.names, self.name_ends, index),
+            self._string(self.emails, self.email_ends, index),
+            self.ages[index]
+        )
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def to_dicts(self):
+        """Returns the batch as a list of plain dicts"""
+        return [record.as_dict() for record in self]